@@ -0,0 +1 @@
+"""套期保值回测核心组件 (不依赖 Streamlit / Plotly，可独立导入)。"""
@@ -0,0 +1,261 @@
+"""命令行入口：不启动 Streamlit，直接对 CSV 行情批量回测并写出结果。
+
+    python -m backtest 行情.csv --lots 3 --multiplier 10 -o out/
+    python -m backtest 行情.csv --state live.json -o out/     # 只处理上次运行之后追加的行
+    python -m backtest a.csv b.csv c.zip --portfolio -o out/  # 多合约组合
+    python -m backtest 逐笔.csv --chunk-rows 1000000 -o out/   # 超大文件分块读取、分块回测
+    python -m backtest 行情.csv --roll-months 1,5,9 --commission 3 --slippage 1 -o out/  # 换月与交易成本
+
+结果表按 --format 写入输出目录，汇总指标以 JSON 打印到标准输出 (或 --metrics 指定的文件)。
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+
+import pandas as pd
+
+from .core import AccountState, backtest_chunks, backtest_metrics, process_append
+from .costs import CostSpec, read_roll_calendar
+from .engine import ENGINES
+from .export import EXPORT_FORMATS, StreamWriter, event_table, write_report
+from .hedge import HEDGE_MODES, HedgeSpec
+from .ingest import iter_cached_chunks, iter_market_chunks, load_market_data, spill_market_file
+from .resample import bars_per_day, bars_per_day_chunks
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m backtest', description='套期保值稳定性回测 (命令行版)')
+    parser.add_argument('csv', nargs='+', help='行情 CSV 文件 (列名识别规则与网页版相同)；--portfolio 时也可以是 ZIP')
+
+    scene = parser.add_argument_group('业务场景 (默认值与网页版侧边栏一致)')
+    scene.add_argument('--multiplier', type=int, default=10, help='合约乘数 (一手的数量)')
+    scene.add_argument('--lots', type=int, default=3, help='下单手数')
+    scene.add_argument('--hedge-ratio', type=float, default=1.0, help='套保比例 (1.0 = 100%%)；动态模式下为预热期比例')
+    scene.add_argument('--hedge-mode', choices=HEDGE_MODES, default='static', help='套保比例模式 (滚动 / EWMA 最小方差)')
+    scene.add_argument('--hedge-window', type=int, default=240, help='rolling 模式的窗口 (行)')
+    scene.add_argument('--hedge-halflife', type=float, default=60.0, help='ewma 模式的半衰期 (行)')
+    scene.add_argument('--margin-rate', type=float, default=0.12, help='保证金率 (0.12 = 12%%)')
+    scene.add_argument('--inject-ratio', type=float, default=1.2, help='补金警戒线 (倍数)')
+    scene.add_argument('--withdraw-ratio', type=float, default=1.5, help='提盈触发线 (倍数)')
+    scene.add_argument('--holding-days', type=int, default=30,
+                       help='库存周转/持仓周期 (天)；分钟 / 逐笔数据按每天的典型行数换算为行，与网页版相同')
+    scene.add_argument('--engine', choices=('auto',) + ENGINES, default='auto', help='账户模拟引擎')
+    scene.add_argument('--start', type=datetime.date.fromisoformat, help='分析起始日期 YYYY-MM-DD (含)')
+    scene.add_argument('--end', type=datetime.date.fromisoformat, help='分析结束日期 YYYY-MM-DD (含)')
+
+    costs = parser.add_argument_group('换月与交易成本')
+    costs.add_argument('--commission', type=float, default=0.0, help='手续费 (元/手，单边)')
+    costs.add_argument('--slippage', type=float, default=0.0, help='滑点 (价格单位/每次成交)')
+    costs.add_argument('--roll-calendar', help='换月日历 CSV：第一列为日期，有第二列合约代码时取代码变化的日期')
+    costs.add_argument('--roll-months', help='按规则换月的合约月份，逗号分隔，例如 1,5,9')
+    costs.add_argument('--expiry-day', type=int, default=15, help='规则换月：合约到期日 (当月第几日)')
+    costs.add_argument('--roll-days', type=int, default=5, help='规则换月：到期前几个自然日换月')
+    costs.add_argument('--margin-schedule', help='分段保证金率，例如 2024-01-01:0.15,2024-06-01:0.10 (起始日期:保证金率)')
+
+    out = parser.add_argument_group('输出')
+    out.add_argument('-o', '--output-dir', default='.', help='结果文件目录 (默认当前目录)')
+    out.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='csv.gz', help='结果文件格式')
+    out.add_argument('--metrics', help='汇总指标 JSON 的输出路径 (默认打印到标准输出)')
+    out.add_argument('--state', help='账户状态 JSON：存在时从中续算新追加的行，结束后写回 (仅限单个 CSV)')
+    out.add_argument('--portfolio', action='store_true', help='把全部输入作为一个多合约组合回测')
+    out.add_argument('--chunk-rows', type=int,
+                     help='分块模式的每块行数：CSV 分块解析并写入 Arrow 缓存，账户逐块续算、结果逐块写出 '
+                          '(峰值内存与文件大小无关；不支持 xlsx 格式)')
+    return parser
+
+
+def _window(frame, start, end):
+    # 与网页版的日期筛选相同：按日期闭区间截取
+    if start is not None:
+        frame = frame[frame['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+        frame = frame[frame['Date'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    return frame
+
+
+def _output_path(args, name):
+    return os.path.join(args.output_dir, f'{name}_backtest.{args.format}')
+
+
+def _write_result(args, name, df):
+    path = _output_path(args, name)
+    write_report(path, df, event_table(df) if args.format == 'xlsx' else None, args.format)
+    return path
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _cost_spec(args):
+    roll_dates = ()
+    if args.roll_calendar:
+        with open(args.roll_calendar, 'rb') as f:
+            roll_dates = read_roll_calendar(f.read())
+    months = tuple(int(m) for m in args.roll_months.split(',') if m.strip()) if args.roll_months else ()
+    schedule = []
+    for item in (args.margin_schedule or '').split(','):
+        if item.strip():
+            date, _, rate = item.partition(':')
+            schedule.append((datetime.date.fromisoformat(date.strip()).isoformat(), float(rate)))
+    return CostSpec(args.commission, args.slippage, args.multiplier, roll_dates, months, args.expiry_day,
+                    args.roll_days, tuple(schedule))
+
+
+def _load_state(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return AccountState.from_dict(json.load(f))
+
+
+def _save_state(path, state):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _holding_params(params, bars):
+    # params 的最后一项是以天计的持仓周期，按文件的每日典型行数换算为行 (日线数据即天数本身)
+    return params[:-1] + (params[-1] * bars,)
+
+
+def run_single(args, params, path):
+    """单合约回测；返回该文件的指标 dict，识别不到列时返回 None。"""
+    with open(path, 'rb') as f:
+        frame, fp = load_market_data(f.read())
+    if frame is None:
+        return None
+    params = _holding_params(params, bars_per_day(frame))
+    frame = _window(frame, args.start, args.end)
+    state = _load_state(args.state) if args.state else None
+    if state is not None:
+        frame = frame[frame['Date'] > state.last_date]
+    hedge = HedgeSpec(args.hedge_mode, window=args.hedge_window, halflife=args.hedge_halflife)
+    df, new_state = process_append(frame, *params, state=state, engine=args.engine, hedge=hedge,
+                                   costs=_cost_spec(args))
+    metrics = backtest_metrics(df) if len(df) else {'rows': 0}
+    metrics['fingerprint'] = fp
+    metrics['holding_rows'] = params[-1]
+    if len(df):
+        metrics['output'] = _write_result(args, os.path.splitext(os.path.basename(path))[0], df)
+    if args.state and new_state is not None:
+        _save_state(args.state, new_state)
+        metrics['total_rows'] = new_state.rows
+    return metrics
+
+
+def run_single_chunked(args, params, path):
+    """分块版 run_single：行情、结果与指标都按块处理，不在内存中拼出整表。"""
+    state = _load_state(args.state) if args.state else None
+    hedge = HedgeSpec(args.hedge_mode, window=args.hedge_window, halflife=args.hedge_halflife)
+    with open(path, 'rb') as f:
+        # 先把 CSV 分块落盘为 Arrow 缓存 (已缓存时直接命中)，再按记录批逐块读回；
+        # 没有 pyarrow 时直接按文件顺序逐块解析 (要求文件本身按时间排序)
+        fp, cached = spill_market_file(f, chunk_rows=args.chunk_rows)
+
+        def read_chunks():
+            return iter_cached_chunks(fp) if cached else iter_market_chunks(f, chunk_rows=args.chunk_rows)
+
+        # 持仓周期的换算按整个文件 (截取日期范围之前) 计，与一次性读取时相同；先单独扫一遍日期
+        params = _holding_params(params, bars_per_day_chunks(read_chunks()))
+        chunks = read_chunks()
+        first = next(chunks, None)
+        if first is None:
+            return None
+        chunks = (_window(c, args.start, args.end) for c in itertools.chain([first], chunks))
+        if state is not None:
+            chunks = (c[c['Date'] > state.last_date] for c in chunks)
+        output = _output_path(args, os.path.splitext(os.path.basename(path))[0])
+        with StreamWriter(output, args.format) as writer:
+            metrics, _, new_state = backtest_chunks(chunks, *params, engine=args.engine, hedge=hedge, state=state,
+                                                    on_chunk=writer.write, costs=_cost_spec(args))
+    if not metrics['rows']:
+        os.remove(output)
+        metrics = {'rows': 0}
+    else:
+        metrics['output'] = output
+    metrics['fingerprint'] = fp
+    metrics['holding_rows'] = params[-1]
+    if args.state and new_state is not None:
+        _save_state(args.state, new_state)
+        metrics['total_rows'] = new_state.rows
+    return metrics
+
+
+def run_portfolio_files(args, params, paths):
+    from .portfolio import load_contract_files, run_portfolio
+
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            files.append((path, f.read()))
+    contracts, skipped = load_contract_files(files)
+    contracts = {k: _window(v, args.start, args.end) for k, v in contracts.items()}
+    contracts = {k: v for k, v in contracts.items() if not v.empty}
+    if not contracts:
+        return None, skipped
+    q, ratio, m_rate, inject_r, withdraw_r, _ = params
+    combined, metrics, per_contract, _ = run_portfolio(
+        contracts, dict(q=q, ratio=ratio, m_rate=m_rate, inject_r=inject_r, withdraw_r=withdraw_r),
+        engine=args.engine)
+    metrics['output'] = _write_result(args, 'portfolio', combined)
+    metrics['contracts'] = {name: row.to_dict() for name, row in per_contract.iterrows()}
+    return metrics, skipped
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.state and (args.portfolio or len(args.csv) > 1):
+        parser.error('--state 只能用于单个 CSV 的增量回测')
+    if args.chunk_rows is not None and (args.portfolio or args.format == 'xlsx' or args.chunk_rows < 1):
+        parser.error('--chunk-rows 须为正数，且不能与 --portfolio 或 xlsx 格式同时使用')
+    try:
+        costs = _cost_spec(args)
+    except (OSError, ValueError) as e:
+        parser.error(f'换月与交易成本设置有误: {e}')
+    if args.portfolio and costs.active:
+        parser.error('换月与交易成本设置暂不支持 --portfolio')
+    params = (args.lots * args.multiplier, args.hedge_ratio, args.margin_rate,
+              args.inject_ratio, args.withdraw_ratio, args.holding_days)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    results, failed = {}, []
+    try:
+        if args.portfolio:
+            metrics, failed = run_portfolio_files(args, params, args.csv)
+            if metrics is not None:
+                results['portfolio'] = metrics
+        else:
+            for path in args.csv:
+                run = run_single_chunked if args.chunk_rows else run_single
+                metrics = run(args, params, path)
+                if metrics is None:
+                    failed.append(path)
+                else:
+                    results[path] = metrics
+    except ValueError as e:
+        # 参数与已保存的账户状态不一致等可预期的错误
+        print(f'错误: {e}', file=sys.stderr)
+        return 2
+    for path in failed:
+        print(f'跳过 {path}: 未识别到 时间/现货/期货 列', file=sys.stderr)
+
+    text = json.dumps(_jsonable(results), ensure_ascii=False, indent=2, default=str)
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 1 if failed or not results else 0
@@ -0,0 +1,130 @@
+"""紧凑回测结果：只保存无法廉价重算的量，其余列按需派生。
+
+process_data 的结果表有十几列 float64，但其中大部分是输入或其他列的简单函数：
+
+- Basis / Cycle_* 由价格与 days 期差值得到 (差值本身在 dataset 里按数据集共享)
+- Margin_Required = 期货价 × q × 套保比例 × 保证金率，Risk_Degree / Line_* 再由它算出
+- Cash_Injection / Cash_Withdrawal 只在事件行非零，事件日志里已经有了
+- Value_Change_* 是权益与累计调度金额的逐行运算
+
+真正需要保存的只有逐行的账户权益 (动态套保时再加逐行比例) 与事件日志；输入行情只记
+数据集句柄，不随结果复制。按 float64 保存时派生出的表与 process_data 逐位相同；
+float32 保存内存再减半，派生列同样以 float32 输出 (相对误差约 1e-7)。换月与交易成本
+(见 backtest.costs) 只改变权益路径，保证金、周期期货盈亏与 Trading_Cost 同样按设置派生。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import dataset
+from .core import _cycle_futures_pnl
+from .costs import active_costs, margin_rates, roll_flags, trade_units
+from .engine import RESULT_COLUMNS
+from .events import INJECTION, WITHDRAWAL, EventLog
+from .metrics import initial_equity, value_changes
+
+PRECISIONS = {'float64': np.float64, 'float32': np.float32}
+DERIVED_COLUMNS = ('Basis', 'Cycle_PnL_NoHedge', 'Cycle_Futures_PnL', 'Cycle_PnL_Hedge', *RESULT_COLUMNS,
+                   'Line_Inject', 'Line_Withdraw', 'Value_Change_NoHedge', 'Value_Change_Hedged')
+
+
+@dataclass(frozen=True)
+class CompactResult:
+    """一次回测的紧凑表示；frame / column() 按需派生完整结果。"""
+    handle: dataset.DatasetHandle
+    params: tuple              # (q, ratio, m_rate, inject_r, withdraw_r, days)
+    hedge: object              # HedgeSpec，静态套保为 None
+    equity: np.ndarray
+    events: EventLog
+    ratios: np.ndarray = None  # 动态套保的逐行比例
+    costs: object = None       # CostSpec，不设置换月与交易成本时为 None
+
+    @classmethod
+    def from_frame(cls, handle, params, hedge, df, events, precision='float64', costs=None):
+        dtype = PRECISIONS[precision]
+        ratios = df['Hedge_Ratio'].to_numpy(dtype=dtype) if 'Hedge_Ratio' in df else None
+        return cls(handle, tuple(params), hedge, df['Account_Equity'].to_numpy(dtype=dtype), events, ratios, costs)
+
+    def __len__(self):
+        return len(self.equity)
+
+    @property
+    def nbytes(self):
+        """结果本身占用的字节数 (不含共享的输入行情)。"""
+        arrays = [self.equity, self.ratios] + [getattr(self.events, f) for f in EventLog.__dataclass_fields__]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def column(self, name):
+        """派生单列 (与 frame 中的同名列相同)。"""
+        if name == 'Hedge_Ratio' and self.ratios is not None:
+            return self.ratios
+        source = dataset.resolve(self.handle)
+        if name in source:
+            return source[name].to_numpy()
+        return self._columns((name,), source)[name]
+
+    @property
+    def frame(self):
+        """完整结果表，列与 process_data 的输出相同；输入列直接引用数据集，不复制。"""
+        source = dataset.resolve(self.handle).reset_index(drop=True)
+        names = DERIVED_COLUMNS
+        if self.costs is not None:
+            at = names.index('Risk_Degree') + 1
+            names = names[:at] + ('Trading_Cost',) + names[at:]
+        columns = self._columns(names, source)
+        extra = {'Hedge_Ratio': self.ratios} if self.ratios is not None else {}
+        return source.assign(**extra, **columns)
+
+    def _columns(self, names, source):
+        q, ratio, m_rate, inject_r, withdraw_r, days = self.params
+        futures = source['Futures'].to_numpy(dtype=np.float64)
+        position = ratio if self.ratios is None else self.ratios.astype(np.float64)
+        m_rates = margin_rates(source['Date'], self.costs, m_rate)
+        rolls = roll_flags(source['Date'], self.costs) if self.costs is not None else None
+        out = {}
+
+        if any(n.startswith(('Basis', 'Cycle')) for n in names):
+            shared = dataset.shared_columns(self.handle, days)
+            out['Basis'] = shared['Basis']
+            out['Cycle_PnL_NoHedge'] = shared['Spot_Diff'] * q
+            if self.ratios is None and not (self.costs is not None and self.costs.rolls):
+                out['Cycle_Futures_PnL'] = -(shared['Futures_Diff']) * q * ratio
+            else:
+                out['Cycle_Futures_PnL'] = _cycle_futures_pnl(futures, q, np.broadcast_to(position, futures.shape),
+                                                              days, None, rolls)[0]
+            out['Cycle_PnL_Hedge'] = out['Cycle_PnL_NoHedge'] + out['Cycle_Futures_PnL']
+
+        # 与账户内核相同的运算顺序：price * q * ratio * m_rate
+        margin = futures * q * position * m_rates
+        equity = self.equity.astype(np.float64)
+        cash = {kind: np.zeros(len(self)) for kind in (INJECTION, WITHDRAWAL)}
+        for kind, values in cash.items():
+            sel = self.events.kind == kind
+            values[self.events.index[sel]] = self.events.amount[sel]
+        out['Account_Equity'] = equity
+        out['Margin_Required'] = margin
+        out['Cash_Injection'], out['Cash_Withdrawal'] = cash[INJECTION], cash[WITHDRAWAL]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['Risk_Degree'] = np.where(margin > 0, equity / margin, 0.0)
+        out['Line_Inject'], out['Line_Withdraw'] = margin * inject_r, margin * withdraw_r
+        if 'Trading_Cost' in names:
+            out['Trading_Cost'] = trade_units(q, np.broadcast_to(position, futures.shape), rolls) * self.costs.unit_cost
+        if any(n.startswith('Value_Change') for n in names):
+            init_eq = initial_equity(futures[0], q, position if self.ratios is None else position[0],
+                                     m_rates[0] if np.ndim(m_rates) else m_rate, inject_r)
+            out['Value_Change_NoHedge'], out['Value_Change_Hedged'] = value_changes(
+                source['Spot'].to_numpy(dtype=np.float64), q, init_eq, equity, out['Cash_Injection'],
+                out['Cash_Withdrawal'])
+
+        dtype = self.equity.dtype
+        return {n: out[n].astype(dtype, copy=False) for n in names}
+
+
+def compact_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', hedge=None,
+                   precision='float64', costs=None):
+    """按句柄回测并压缩为 CompactResult (完整结果表只在计算时短暂存在)。"""
+    costs = active_costs(costs)
+    result = dataset.backtest_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine=engine, hedge=hedge,
+                                     costs=costs)
+    return CompactResult.from_frame(handle, (q, ratio, m_rate, inject_r, withdraw_r, days), hedge,
+                                    result.frame, result.events, precision, costs)
@@ -0,0 +1,314 @@
+"""回测主流程：process_data 及其增量 (追加行) 版本。
+
+process_append 把上一次运行的期末状态 (权益、最后期货价、累计补金/提盈、建仓权益、
+最近 days 行的价格窗口) 存在 AccountState 里，新追加的行只需 O(新增行数) 的计算，
+输出与对整段历史重新跑 process_data 逐位相同。动态套保 (hedge 参数，见 backtest.hedge)
+下期货头寸逐行变化，比例估计器与周期期货盈亏的前缀和同样随状态续算。换月、交易成本与
+分段保证金率 (costs 参数，见 backtest.costs) 在账户内核里处理，同样可以续算。
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .costs import active_costs, margin_rates, roll_flags
+from .engine import simulate_account
+from .events import EventLog
+from .hedge import HedgeSpec, hedge_ratios
+from .metrics import StreamingSummary, initial_equity, summary_metrics, value_changes
+
+PARAM_NAMES = ('q', 'ratio', 'm_rate', 'inject_r', 'withdraw_r', 'days')
+
+
+@dataclass
+class AccountState:
+    """一次回测结束时的账户状态，可序列化后在下次追加数据时续算。"""
+    params: tuple
+    rows: int
+    last_date: pd.Timestamp
+    equity: float
+    last_futures: float
+    cum_injection: float
+    cum_withdrawal: float
+    initial_equity: float
+    first_spot: float
+    spot_tail: np.ndarray = field(repr=False)
+    futures_tail: np.ndarray = field(repr=False)
+    hedge: tuple = None                                   # 动态套保设置 (HedgeSpec.to_list)，静态为 None
+    hedge_state: dict = field(default=None, repr=False)
+    costs: list = None                                    # 换月与交易成本设置 (CostSpec.to_list)
+    cost_state: dict = field(default=None, repr=False)    # 静态套保 + 换月时周期期货盈亏的续算状态
+
+    def to_dict(self):
+        return {
+            'params': list(self.params), 'rows': self.rows, 'last_date': self.last_date.isoformat(),
+            'equity': self.equity, 'last_futures': self.last_futures,
+            'cum_injection': self.cum_injection, 'cum_withdrawal': self.cum_withdrawal,
+            'initial_equity': self.initial_equity, 'first_spot': self.first_spot,
+            'spot_tail': self.spot_tail.tolist(), 'futures_tail': self.futures_tail.tolist(),
+            'hedge': list(self.hedge) if self.hedge else None, 'hedge_state': self.hedge_state,
+            'costs': self.costs, 'cost_state': self.cost_state,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            params=tuple(data['params']), rows=int(data['rows']), last_date=pd.Timestamp(data['last_date']),
+            equity=float(data['equity']), last_futures=float(data['last_futures']),
+            cum_injection=float(data['cum_injection']), cum_withdrawal=float(data['cum_withdrawal']),
+            initial_equity=float(data['initial_equity']), first_spot=float(data['first_spot']),
+            spot_tail=np.asarray(data['spot_tail'], dtype=np.float64),
+            futures_tail=np.asarray(data['futures_tail'], dtype=np.float64),
+            hedge=tuple(data['hedge']) if data.get('hedge') else None, hedge_state=data.get('hedge_state'),
+            costs=data.get('costs'), cost_state=data.get('cost_state'),
+        )
+
+
+def _tail_diff(values, tail, days):
+    # 把上一段最后 days 行接在前面做 diff，保证新行的周期差值与整段计算一致
+    joined = pd.Series(np.concatenate((tail, values)))
+    return joined.diff(days).to_numpy()[len(tail):]
+
+
+def _cycle_futures_pnl(futures, q, ratios, days, state, rolls=None):
+    """动态头寸下的周期期货盈亏：逐行盈亏 -(F_i - F_{i-1})·q·h_{i-1} 在最近 days 行上的和。
+
+    用前缀和之差求窗口和，续算时接上一段的累计值与最近 days 个前缀和；前 days 行为 NaN，
+    与静态比例下 diff(days) 的口径一致。rolls 标记的换月行不计新旧合约间的价差。
+    """
+    prev_f = state['last_futures'] if state else futures[0]
+    prev_r = state['last_ratio'] if state else ratios[0]
+    step = -(np.diff(futures, prepend=prev_f)) * q * np.concatenate(([prev_r], ratios[:-1]))
+    if rolls is not None:
+        step[rolls] = 0.0
+    prefix = np.cumsum(np.concatenate(([state['pnl_sum'] if state else 0.0], step)))
+    tail = np.asarray(state['pnl_tail'], dtype=np.float64) if state else prefix[:1]
+    joined = np.concatenate((tail, prefix[1:]))
+    lag = np.arange(len(tail), len(joined)) - days
+    cycle = prefix[1:] - joined[np.maximum(lag, 0)]
+    seen = state['seen'] + 1 if state else 0
+    cycle[seen + np.arange(len(futures)) < days] = np.nan
+    return cycle, {'pnl_sum': float(prefix[-1]), 'pnl_tail': joined[-max(days, 1):].tolist()}
+
+
+@dataclass(frozen=True)
+class BacktestResult:
+    """一次回测的结果表与资金调度事件日志。"""
+    frame: pd.DataFrame
+    events: EventLog
+
+
+def process_append(df_new, q, ratio, m_rate, inject_r, withdraw_r, days, state=None, engine='auto', shared=None,
+                   hedge=None, costs=None):
+    """处理一段行情：state 为空时从首行建仓，否则从 state 续算。返回 (结果表, 新状态)。
+
+    shared 可传入与 df_new 逐行对齐、已预先算好的 Basis / Spot_Diff / Futures_Diff
+    (见 backtest.dataset)，用于在多个时间窗口间复用全历史上的计算。hedge 为 HedgeSpec 时
+    期货头寸按动态套保比例逐行调整 (结果多出 Hedge_Ratio 列)，ratio 作为预热期的比例。
+    costs 为 CostSpec 时按换月日历、手续费 / 滑点与分段保证金率推进账户 (结果多出 Trading_Cost 列)。
+    """
+    df, new_state, _ = _process(df_new, q, ratio, m_rate, inject_r, withdraw_r, days, state, engine, shared, hedge,
+                                costs)
+    return df, new_state
+
+
+def _process(df_new, q, ratio, m_rate, inject_r, withdraw_r, days, state, engine, shared, hedge, costs=None):
+    # process_append 的实现，额外返回本段的事件日志 (行号为全历史行号)
+    params = (q, ratio, m_rate, inject_r, withdraw_r, days)
+    hedge = hedge if hedge is not None and hedge.dynamic else None
+    costs = active_costs(costs)
+    if state is not None and (tuple(state.params) != params
+                              or tuple(state.hedge or ()) != tuple(hedge.to_list() if hedge else ())
+                              or state.costs != (costs.to_list() if costs else None)):
+        raise ValueError("参数与已保存的账户状态不一致，需要全量重算")
+    # pandas 的写时复制下 reset_index 不复制数据，新增列也不会改动调用方的表
+    df = df_new.reset_index(drop=True)
+    if df.empty:
+        return df, state, EventLog.empty()
+    spot = df['Spot'].to_numpy(dtype=np.float64)
+    futures = df['Futures'].to_numpy(dtype=np.float64)
+    rows = state.rows if state is not None else 0
+    m_rates = margin_rates(df['Date'], costs, m_rate)
+    rolls = roll_flags(df['Date'], costs, state.last_date if state is not None else None) if costs else None
+    hedge_state = cost_state = None
+    if hedge is not None:
+        prev_hedge = state.hedge_state if state is not None else None
+        ratios, hedge_state = hedge_ratios(spot, futures, hedge, ratio, state=prev_hedge)
+        cycle_futures, pnl_state = _cycle_futures_pnl(futures, q, ratios, days, prev_hedge, rolls)
+        hedge_state.update(pnl_state)
+        df['Hedge_Ratio'] = ratios
+        position = ratios
+    else:
+        position = ratio
+        if rolls is not None and costs.rolls:
+            # 换月行的价差不计入周期期货盈亏，改按逐行盈亏的窗口和计算
+            prev_cost = state.cost_state if state is not None else None
+            cycle_futures, cost_state = _cycle_futures_pnl(futures, q, np.full(len(futures), ratio), days, prev_cost,
+                                                           rolls)
+            cost_state.update(seen=rows + len(futures) - 1, last_futures=float(futures[-1]), last_ratio=ratio)
+
+    if shared is not None:
+        df['Basis'] = shared['Basis']
+        df['Cycle_PnL_NoHedge'] = shared['Spot_Diff'] * q
+        df['Cycle_Futures_PnL'] = -(shared['Futures_Diff']) * q * ratio
+    elif state is None:
+        df['Basis'] = df['Spot'] - df['Futures']
+        df['Cycle_PnL_NoHedge'] = df['Spot'].diff(days) * q
+        df['Cycle_Futures_PnL'] = -(df['Futures'].diff(days)) * q * ratio
+    else:
+        df['Basis'] = df['Spot'] - df['Futures']
+        df['Cycle_PnL_NoHedge'] = _tail_diff(spot, state.spot_tail, days) * q
+        df['Cycle_Futures_PnL'] = -(_tail_diff(futures, state.futures_tail, days)) * q * ratio
+    if hedge is not None or cost_state is not None:
+        df['Cycle_Futures_PnL'] = cycle_futures
+    df['Cycle_PnL_Hedge'] = df['Cycle_PnL_NoHedge'] + df['Cycle_Futures_PnL']
+
+    cost_kwargs = dict(rolls=rolls, unit_cost=costs.unit_cost) if costs else {}
+    if state is None:
+        init_equity = initial_equity(futures[0], q, ratios[0] if hedge else ratio,
+                                     m_rates[0] if np.ndim(m_rates) else m_rate, inject_r)
+        account = simulate_account(futures, q, position, m_rates, inject_r, withdraw_r, engine=engine, **cost_kwargs)
+        value_no, value_hedged = value_changes(spot, q, init_equity, account['Account_Equity'],
+                                               account['Cash_Injection'], account['Cash_Withdrawal'])
+        first_spot, cum_in, cum_out = spot[0], 0.0, 0.0
+        spot_hist, fut_hist = spot, futures
+    else:
+        init_equity = state.initial_equity
+        account = simulate_account(futures, q, position, m_rates, inject_r, withdraw_r, engine=engine,
+                                   start_equity=state.equity, prev_price=state.last_futures,
+                                   prev_ratio=state.hedge_state['last_ratio'] if hedge else None, **cost_kwargs)
+        value_no, value_hedged = value_changes(spot, q, init_equity, account['Account_Equity'],
+                                               account['Cash_Injection'], account['Cash_Withdrawal'],
+                                               first_spot=state.first_spot,
+                                               cum_in0=state.cum_injection, cum_out0=state.cum_withdrawal)
+        first_spot, cum_in, cum_out = state.first_spot, state.cum_injection, state.cum_withdrawal
+        spot_hist = np.concatenate((state.spot_tail, spot))
+        fut_hist = np.concatenate((state.futures_tail, futures))
+
+    for col, values in account.items():
+        df[col] = values
+    events = EventLog.from_account(df['Date'].to_numpy(), account['Cash_Injection'], account['Cash_Withdrawal'],
+                                   account['Account_Equity'], offset=rows)
+    df['Line_Inject'], df['Line_Withdraw'] = df['Margin_Required'] * inject_r, df['Margin_Required'] * withdraw_r
+    df['Value_Change_NoHedge'], df['Value_Change_Hedged'] = value_no, value_hedged
+
+    new_state = AccountState(
+        params=params,
+        rows=rows + len(df),
+        last_date=pd.Timestamp(df['Date'].iloc[-1]),
+        equity=float(account['Account_Equity'][-1]),
+        last_futures=float(futures[-1]),
+        cum_injection=float(np.cumsum(np.concatenate(([cum_in], account['Cash_Injection'])))[-1]),
+        cum_withdrawal=float(np.cumsum(np.concatenate(([cum_out], account['Cash_Withdrawal'])))[-1]),
+        initial_equity=float(init_equity),
+        first_spot=float(first_spot),
+        spot_tail=spot_hist[-days:].copy() if days > 0 else np.empty(0),
+        futures_tail=fut_hist[-days:].copy() if days > 0 else np.empty(0),
+        hedge=tuple(hedge.to_list()) if hedge else None,
+        hedge_state=hedge_state,
+        costs=costs.to_list() if costs else None,
+        cost_state=cost_state,
+    )
+    return df, new_state, events
+
+
+def process_data(df_input, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', shared=None, hedge=None,
+                 costs=None):
+    """对整段行情做一次完整回测，输出列与原版 process_data 相同 (动态套保时多出 Hedge_Ratio 列)。"""
+    df, _ = process_append(df_input, q, ratio, m_rate, inject_r, withdraw_r, days, engine=engine, shared=shared,
+                           hedge=hedge, costs=costs)
+    return df
+
+
+def run_backtest(df_input, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', shared=None, hedge=None,
+                 costs=None):
+    """与 process_data 相同，另外返回推进账户时记录的事件日志。"""
+    df, _, events = _process(df_input, q, ratio, m_rate, inject_r, withdraw_r, days, None, engine, shared, hedge,
+                             costs)
+    return BacktestResult(df, events)
+
+
+def backtest_metrics(df):
+    """一次回测结果的汇总指标：指标卡四项 (单位：元) 加上补金 / 提盈的次数与总额 (有交易成本时另有 total_cost)。"""
+    metrics = summary_metrics(df['Value_Change_NoHedge'], df['Value_Change_Hedged'],
+                              df['Cash_Injection'], df['Cash_Withdrawal'])
+    metrics.update(
+        rows=len(df),
+        injection_count=int((df['Cash_Injection'] > 0).sum()),
+        withdrawal_count=int((df['Cash_Withdrawal'] > 0).sum()),
+        total_injection=float(df['Cash_Injection'].sum()),
+        total_withdrawal=float(df['Cash_Withdrawal'].sum()),
+    )
+    if 'Trading_Cost' in df:
+        metrics['total_cost'] = float(df['Trading_Cost'].sum())
+    return metrics
+
+
+def backtest_chunks(chunks, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', hedge=None, state=None,
+                    on_chunk=None, costs=None):
+    """逐块回测按时间排序的 Date/Spot/Futures 表 (例如 ingest.iter_cached_chunks 的输出)。
+
+    账户状态 (权益、最后价格、累计补金 / 提盈、最近 days 行价格) 跨块续算，各块结果与整段
+    process_data 的对应行逐位相同；每块结果交给 on_chunk 后即丢弃，峰值内存只与块大小有关。
+    返回 (backtest_metrics 口径的汇总指标, 事件日志, 期末 AccountState)。
+    """
+    summary = StreamingSummary()
+    events = []
+    total_cost = None
+    for chunk in chunks:
+        df, state, chunk_events = _process(chunk, q, ratio, m_rate, inject_r, withdraw_r, days, state, engine, None,
+                                           hedge, costs)
+        if df.empty:
+            continue
+        summary.update(df['Value_Change_NoHedge'].to_numpy(), df['Value_Change_Hedged'].to_numpy(),
+                       df['Cash_Injection'].to_numpy(), df['Cash_Withdrawal'].to_numpy())
+        events.append(chunk_events)
+        if 'Trading_Cost' in df:
+            total_cost = (total_cost or 0.0) + float(df['Trading_Cost'].sum())
+        if on_chunk is not None:
+            on_chunk(df)
+    metrics = summary.result()
+    if total_cost is not None:
+        metrics['total_cost'] = total_cost
+    return metrics, EventLog.concat(events), state
+
+
+class IncrementalBacktest:
+    """面向不断追加的数据源的实时监控：每次 update 只处理上次之后的新行。"""
+
+    def __init__(self, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', state=None, keep_history=True,
+                 hedge=None, costs=None):
+        self.params = (q, ratio, m_rate, inject_r, withdraw_r, days)
+        self.engine = engine
+        self.hedge = hedge
+        self.costs = costs
+        self.state = state
+        self.keep_history = keep_history
+        self._chunks = []
+        self._events = []
+
+    def update(self, df):
+        """df 可以是完整的最新数据集，也可以只是新追加的行；时间不晚于上次末行的记录会被忽略。"""
+        if self.state is not None:
+            df = df[df['Date'] > self.state.last_date]
+        new_rows, self.state, events = _process(df, *self.params, self.state, self.engine, None, self.hedge,
+                                                self.costs)
+        if self.keep_history and len(new_rows):
+            self._chunks.append(new_rows)
+            self._events.append(events)
+        return new_rows
+
+    @property
+    def frame(self):
+        if not self._chunks:
+            return pd.DataFrame()
+        if len(self._chunks) > 1:
+            self._chunks = [pd.concat(self._chunks, ignore_index=True)]
+        return self._chunks[0]
+
+    @property
+    def events(self):
+        """已处理全部行的事件日志，行号为全历史行号。"""
+        if len(self._events) > 1:
+            self._events = [EventLog.concat(self._events)]
+        return self._events[0] if self._events else EventLog.empty()
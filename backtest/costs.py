@@ -0,0 +1,163 @@
+"""换月日历、交易成本与分时段保证金率。
+
+连续合约 (主力连续) 的 Futures 列在换月日把新旧两个合约首尾相接，相邻两行的价差里
+混进了合约间的价差。设置换月后，换月行不结算这段价差 (视为平旧开新)，同时按成交手数
+收取手续费与滑点：
+
+- 换月日：显式的日期表 (例如由带合约代码列的换月日历得到，见 roll_dates_from_contracts)，
+  或按规则——合约在 roll_months 各月的 expiry_day 日到期，到期前 roll_days 个自然日换月。
+  每个换月日落在其当日或之后的第一行
+- 成交：首行建仓、动态套保逐行调仓 (|Δ头寸|)、换月时平旧开新 (旧头寸 + 新头寸)。
+  每单位成交的成本 = 手续费 (元/手) / 合约乘数 + 滑点 (价格单位)，在账户内核里从权益中扣除，
+  可能因此触发补金；首行的建仓成本通常由首行补金支付
+- 保证金率：((起始日期, 保证金率), ...) 的分段表，起始日期之前沿用统一的保证金率
+
+CostSpec 可哈希，与 HedgeSpec 一样直接作为缓存键的一部分；全部为默认值时等同于不设置。
+"""
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class CostSpec:
+    """换月与交易成本设置；日期均为 ISO 格式字符串。"""
+    commission: float = 0.0        # 手续费 (元/手，单边)
+    slippage: float = 0.0          # 滑点 (价格单位/每次成交)
+    multiplier: float = 1.0        # 合约乘数，用于把头寸数量换算为手数
+    roll_dates: tuple = ()         # 显式换月日
+    roll_months: tuple = ()        # 规则换月：合约月份 (1~12)
+    expiry_day: int = 15           # 规则换月：到期日 (当月第几日)
+    roll_days: int = 5             # 规则换月：到期前几个自然日换月
+    margin_schedule: tuple = ()    # ((起始日期, 保证金率), ...)
+
+    def __post_init__(self):
+        if self.commission < 0 or self.slippage < 0:
+            raise ValueError("手续费与滑点不能为负")
+        if self.multiplier <= 0:
+            raise ValueError("合约乘数必须为正")
+        if any(not 1 <= int(m) <= 12 for m in self.roll_months):
+            raise ValueError("合约月份必须在 1~12 之间")
+        if not 1 <= self.expiry_day <= 31 or self.roll_days < 0:
+            raise ValueError("到期日须在 1~31 之间，换月提前天数不能为负")
+        if any(rate <= 0 for _, rate in self.margin_schedule):
+            raise ValueError("分段保证金率必须为正")
+
+    @property
+    def unit_cost(self):
+        """每单位头寸成交一次的成本 (元)。"""
+        return self.commission / self.multiplier + self.slippage
+
+    @property
+    def rolls(self):
+        return bool(self.roll_dates or self.roll_months)
+
+    @property
+    def active(self):
+        return self.unit_cost > 0 or self.rolls or bool(self.margin_schedule)
+
+    def to_list(self):
+        return [self.commission, self.slippage, self.multiplier, list(self.roll_dates), list(self.roll_months),
+                self.expiry_day, self.roll_days, [list(p) for p in self.margin_schedule]]
+
+    @classmethod
+    def from_list(cls, data):
+        commission, slippage, multiplier, roll_dates, roll_months, expiry_day, roll_days, schedule = data
+        return cls(float(commission), float(slippage), float(multiplier), tuple(roll_dates),
+                   tuple(int(m) for m in roll_months), int(expiry_day), int(roll_days),
+                   tuple((str(d), float(r)) for d, r in schedule))
+
+
+def active_costs(costs):
+    """只有真正改变回测的设置才参与计算与缓存键；其余视为 None。"""
+    return costs if costs is not None and costs.active else None
+
+
+# ==============================================================================
+# 1. 🔁 换月日历
+# ==============================================================================
+def expiry_roll_dates(start, end, months, expiry_day=15, roll_days=5):
+    """[start, end] 期间按规则得到的换月日 (到期日前 roll_days 个自然日)。"""
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    out = []
+    for year in range(start.year, end.year + 2):
+        for month in sorted(set(int(m) for m in months)):
+            last_day = pd.Timestamp(year=year, month=month, day=1).days_in_month
+            expiry = pd.Timestamp(year=year, month=month, day=min(expiry_day, last_day))
+            roll = expiry - pd.Timedelta(days=roll_days)
+            if start <= roll <= end:
+                out.append(roll)
+    return pd.DatetimeIndex(out)
+
+
+def roll_dates_from_contracts(dates, codes):
+    """由逐行的合约代码得到换月日：代码与上一行不同的行所在的日期。"""
+    codes = pd.Series(np.asarray(codes)).astype(str).str.strip()
+    switch = (codes != codes.shift()).to_numpy(copy=True)
+    switch[:1] = False
+    return pd.DatetimeIndex(np.asarray(dates)[switch]).normalize().unique()
+
+
+def read_roll_calendar(data):
+    """读取换月日历 CSV：第一列为日期；有第二列时视为合约代码，取代码变化的日期，
+    否则每行即一个换月日。返回按时间排序的 ISO 日期字符串元组。"""
+    table = pd.read_csv(io.BytesIO(data), dtype=str, encoding_errors='replace').dropna(how='all')
+    if table.empty:
+        return ()
+    dates = pd.to_datetime(table.iloc[:, 0].str.strip(), errors='coerce')
+    keep = dates.notna().to_numpy()
+    if table.shape[1] > 1:
+        order = np.argsort(dates[keep].to_numpy(), kind='stable')
+        rolls = roll_dates_from_contracts(dates[keep].to_numpy()[order], table.iloc[:, 1][keep].to_numpy()[order])
+    else:
+        rolls = pd.DatetimeIndex(dates[keep]).normalize().unique()
+    return tuple(d.date().isoformat() for d in rolls.sort_values())
+
+
+def roll_flags(dates, costs, prev_date=None):
+    """逐行的换月标记：每个换月日当日或之后的第一行为 True。
+
+    prev_date 为上一段最后一行的时间 (续算时传入)；不传时首行是建仓行，不算换月。
+    """
+    dates = pd.DatetimeIndex(dates)
+    flags = np.zeros(len(dates), dtype=np.bool_)
+    if costs is None or not costs.rolls or len(dates) == 0:
+        return flags
+    first = dates[0] if prev_date is None else pd.Timestamp(prev_date)
+    rolls = pd.DatetimeIndex([pd.Timestamp(d) for d in costs.roll_dates])
+    if costs.roll_months:
+        rolls = rolls.append(expiry_roll_dates(first, dates[-1], costs.roll_months, costs.expiry_day,
+                                               costs.roll_days))
+    rolls = rolls[rolls > first].unique()
+    rows = np.searchsorted(dates.to_numpy(), rolls.to_numpy(), 'left')
+    rows = rows[rows < len(dates)]
+    flags[rows] = True
+    if prev_date is None:
+        flags[0] = False
+    return flags
+
+
+# ==============================================================================
+# 2. 💸 保证金率与成交量
+# ==============================================================================
+def margin_rates(dates, costs, m_rate):
+    """逐行保证金率；没有分段表时返回标量 m_rate 本身。"""
+    if costs is None or not costs.margin_schedule:
+        return m_rate
+    schedule = sorted((pd.Timestamp(d), float(r)) for d, r in costs.margin_schedule)
+    starts = pd.DatetimeIndex([d for d, _ in schedule]).to_numpy()
+    rates = np.array([m_rate] + [r for _, r in schedule], dtype=np.float64)
+    return rates[np.searchsorted(starts, pd.DatetimeIndex(dates).to_numpy(), 'right')]
+
+
+def trade_units(q, ratios, rolls, prev_ratio=None):
+    """逐行成交的头寸数量 (与账户内核的运算顺序一致)：首行建仓 / 换月平旧开新 / 调仓差额。"""
+    ratios = np.asarray(ratios, dtype=np.float64)
+    position = q * ratios
+    prev = np.empty_like(position)
+    prev[1:] = position[:-1]
+    if len(position):
+        prev[0] = q * prev_ratio if prev_ratio is not None else 0.0
+    return np.where(rolls, np.abs(prev) + np.abs(position), np.abs(position - prev))
@@ -0,0 +1,204 @@
+"""轻量数据集句柄：用 (内容指纹, 起止日期) 代替整张 DataFrame 作为缓存键。
+
+全量行情登记在进程内的有界 LRU 表里，由所有会话共享；句柄只携带几个字段，
+缓存层对它的哈希是常数开销。不同日期窗口共用的全历史计算 (Basis、各周期的 diff)
+按 (指纹, days) 只算一次，窗口内的结果直接切片得到。
+
+分钟 / 逐笔数据的 5 分钟、1 小时、日线聚合 (见 backtest.resample) 每个数据集只构建一次，
+以 "指纹@级别" 登记为独立的数据集，句柄、共享计算与缓存对它们同样适用。
+"""
+import datetime
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from . import core, walkforward
+from .ingest import load_cached_frame
+from .resample import LEVELS, bars_per_day, build_pyramid
+
+MAX_DATASETS = int(os.environ.get('HEDGE_MAX_DATASETS', 8))
+LEVEL_SEP = '@'
+
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class DatasetHandle:
+    """数据集句柄；start / end 为闭区间的日期边界，None 表示不截断。"""
+    fingerprint: str
+    start: datetime.date = None
+    end: datetime.date = None
+
+    def window(self, start, end):
+        return replace(self, start=start, end=end)
+
+
+# ==============================================================================
+# 1. 🗂️ 进程内数据集登记表 (有界 LRU)
+# ==============================================================================
+def register(frame, fp):
+    """登记按时间排序的 Date/Spot/Futures 全量表，返回不带日期边界的句柄。"""
+    with _registry_lock:
+        _registry[fp] = frame
+        _registry.move_to_end(fp)
+        while len(_registry) > MAX_DATASETS:
+            _registry.popitem(last=False)
+    return DatasetHandle(fp)
+
+
+def full_frame(fp):
+    """按指纹取全量表；登记表已淘汰时回落到磁盘上的 Arrow 缓存。"""
+    with _registry_lock:
+        frame = _registry.get(fp)
+        if frame is not None:
+            _registry.move_to_end(fp)
+            return frame
+    if LEVEL_SEP in fp:
+        # 聚合级别被淘汰时由原始数据重建 (原始数据本身可回落到磁盘缓存)
+        base, level = fp.split(LEVEL_SEP, 1)
+        frame = _register_pyramid(base).get(level)
+        if frame is None:
+            raise KeyError(f"数据集 {base} 没有 {level} 聚合级别")
+        return frame
+    frame = load_cached_frame(fp)
+    if frame is None:
+        raise KeyError(f"数据集 {fp} 已过期，请重新上传")
+    register(frame, fp)
+    return frame
+
+
+def bounds(handle):
+    """句柄在全量表中对应的行区间 [i0, i1)，与原版按 Date.dt.date 闭区间筛选等价。"""
+    dates = full_frame(handle.fingerprint)['Date'].to_numpy()
+    i0 = 0 if handle.start is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(handle.start)), 'left'))
+    if handle.end is None:
+        i1 = int(np.count_nonzero(~pd.isna(dates)))
+    else:
+        end = pd.Timestamp(handle.end) + pd.Timedelta(days=1)
+        i1 = int(np.searchsorted(dates, np.datetime64(end), 'left'))
+    return i0, max(i0, i1)
+
+
+def resolve(handle):
+    """取出句柄对应窗口的 Date/Spot/Futures 表 (切片视图，不做布尔筛选的整表拷贝)。"""
+    i0, i1 = bounds(handle)
+    return full_frame(handle.fingerprint).iloc[i0:i1]
+
+
+# ==============================================================================
+# 2. ♻️ 跨窗口共享的全历史计算
+# ==============================================================================
+@lru_cache(maxsize=16)
+def _basis(fp):
+    frame = full_frame(fp)
+    return (frame['Spot'] - frame['Futures']).to_numpy()
+
+
+@lru_cache(maxsize=32)
+def _diffs(fp, days):
+    frame = full_frame(fp)
+    return frame['Spot'].diff(days).to_numpy(), frame['Futures'].diff(days).to_numpy()
+
+
+def shared_columns(handle, days):
+    """窗口内的 Basis 与 days 期差值。
+
+    全历史 diff 在窗口第 days 行之后与窗口内单独计算完全相同，窗口前 days 行
+    置为 NaN，即与对窗口单独做 diff 的结果逐位一致。
+    """
+    i0, i1 = bounds(handle)
+    spot_diff, fut_diff = _diffs(handle.fingerprint, days)
+    spot_diff, fut_diff = spot_diff[i0:i1].copy(), fut_diff[i0:i1].copy()
+    head = min(max(days, 0), i1 - i0)
+    spot_diff[:head] = np.nan
+    fut_diff[:head] = np.nan
+    return {'Basis': _basis(handle.fingerprint)[i0:i1], 'Spot_Diff': spot_diff, 'Futures_Diff': fut_diff}
+
+
+def backtest_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', hedge=None, costs=None):
+    """按句柄回测，复用全历史上的共享计算；动态套保比例在窗口内从首行开始估计。
+
+    返回 core.BacktestResult (结果表 + 事件日志)。
+    """
+    return core.run_backtest(resolve(handle), q, ratio, m_rate, inject_r, withdraw_r, days,
+                             engine=engine, shared=shared_columns(handle, days), hedge=hedge, costs=costs)
+
+
+def process_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', hedge=None, costs=None):
+    """只要结果表时的 backtest_handle。"""
+    return backtest_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine=engine, hedge=hedge,
+                           costs=costs).frame
+
+
+def walk_forward_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, length=12, step=1, unit='months',
+                        engine='auto', hedge=None):
+    """句柄范围内的滚动窗口回测 (见 backtest.walkforward)，各窗口共用全历史的差值。"""
+    return walkforward.run_walk_forward(resolve(handle), q, ratio, m_rate, inject_r, withdraw_r, days,
+                                        length=length, step=step, unit=unit, engine=engine, hedge=hedge,
+                                        shared=shared_columns(handle, days))
+
+
+# ==============================================================================
+# 3. 🪜 多分辨率金字塔
+# ==============================================================================
+def _register_pyramid(fp):
+    levels = build_pyramid(full_frame(fp))
+    for level, frame in levels.items():
+        if level != 'raw':
+            register(frame, f'{fp}{LEVEL_SEP}{level}')
+    return levels
+
+
+@lru_cache(maxsize=16)
+def available_levels(fp):
+    """数据集实际存在的聚合级别 (由细到粗)；首次调用时构建并登记整个金字塔。"""
+    return tuple(_register_pyramid(fp))
+
+
+def base_fingerprint(handle):
+    return handle.fingerprint.split(LEVEL_SEP, 1)[0]
+
+
+def level_of(handle):
+    parts = handle.fingerprint.split(LEVEL_SEP, 1)
+    return parts[1] if len(parts) > 1 else 'raw'
+
+
+def level_handle(handle, level):
+    """同一日期窗口在指定聚合级别上的句柄；该级别不存在 (行数未减少) 时退回更细的一级。"""
+    if level not in LEVELS:
+        raise ValueError(f"未知的聚合级别: {level!r}，可选 {LEVELS}")
+    fp = base_fingerprint(handle)
+    available = available_levels(fp)
+    level = max((lv for lv in available if LEVELS.index(lv) <= LEVELS.index(level)), key=LEVELS.index)
+    return replace(handle, fingerprint=fp if level == 'raw' else f'{fp}{LEVEL_SEP}{level}')
+
+
+def window_rows(handle):
+    i0, i1 = bounds(handle)
+    return i1 - i0
+
+
+def choose_level(handle, max_rows):
+    """窗口内行数不超过 max_rows 的最细级别；都超过时用最粗的一级。只做二分查找，不扫描数据。"""
+    levels = available_levels(base_fingerprint(handle))
+    for level in levels:
+        if window_rows(level_handle(handle, level)) <= max_rows:
+            return level
+    return levels[-1]
+
+
+@lru_cache(maxsize=64)
+def _bars_per_day(fp):
+    return bars_per_day(full_frame(fp))
+
+
+def holding_rows(handle, days):
+    """以天计的持仓周期在该句柄所在级别上对应的行数 (日线数据即 days 本身)。"""
+    return int(days) * _bars_per_day(handle.fingerprint)
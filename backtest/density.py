@@ -0,0 +1,78 @@
+"""风险分布的核密度估计：线性分箱 + FFT 卷积，复杂度 O(n + g log g)。
+
+scipy.stats.gaussian_kde 在 g 个网格点上求值需要 O(n·g) 次核函数计算；
+这里先把样本线性分配到 g 个等距箱上，再与离散化的高斯核做一次 FFT 卷积，
+最后线性插值到绘图网格。带宽规则与 gaussian_kde 的一维定义一致。
+"""
+import numpy as np
+
+BANDWIDTH_RULES = ('scott', 'silverman')
+_KERNEL_SPAN = 4.0   # 核函数截断在 ±4 倍带宽处 (其外权重 < 1e-4)
+
+
+def bandwidth(x, rule='scott'):
+    """一维高斯核带宽：样本标准差 (ddof=1) 乘以 gaussian_kde 同名规则的因子。"""
+    n = len(x)
+    if rule == 'scott':
+        factor = n ** (-1 / 5)
+    elif rule == 'silverman':
+        factor = (n * 3 / 4) ** (-1 / 5)
+    else:
+        raise ValueError(f"未知的带宽规则: {rule!r}，可选 {BANDWIDTH_RULES}")
+    return float(np.std(x, ddof=1)) * factor
+
+
+def linear_binning(x, lo, delta, bins):
+    """把样本按到两侧箱中心的距离线性分配权重，返回长度为 bins 的计数。"""
+    pos = (np.asarray(x, dtype=np.float64) - lo) / delta
+    left = np.clip(np.floor(pos).astype(np.int64), 0, bins - 2)
+    frac = np.clip(pos - left, 0.0, 1.0)
+    return (np.bincount(left, weights=1.0 - frac, minlength=bins)
+            + np.bincount(left + 1, weights=frac, minlength=bins))
+
+
+def fft_kde(x, grid, rule='scott', bins=4096):
+    """在 grid 上求 x 的高斯核密度。内部分箱区间覆盖样本与网格并各向外延伸 4 倍带宽。"""
+    x = np.asarray(x, dtype=np.float64)
+    grid = np.asarray(grid, dtype=np.float64)
+    h = bandwidth(x, rule)
+    lo = min(x.min(), grid.min()) - _KERNEL_SPAN * h
+    hi = max(x.max(), grid.max()) + _KERNEL_SPAN * h
+    delta = (hi - lo) / (bins - 1)
+    counts = linear_binning(x, lo, delta, bins)
+
+    half = min(bins - 1, int(np.ceil(_KERNEL_SPAN * h / delta)))
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / h) ** 2) / (h * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(bins + len(kernel) - 1)))
+    conv = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    density = np.maximum(conv[half:half + bins], 0.0) / len(x)
+    return np.interp(grid, lo + np.arange(bins) * delta, density)
+
+
+def summary_stats(x):
+    """均值 / 标准差 / 中位数 / 5% 与 95% 分位数 (与原版 pandas + np.percentile 口径一致)。"""
+    x = np.asarray(x, dtype=np.float64)
+    q5, median, q95 = np.percentile(x, [5, 50, 95])
+    return {'mean': float(x.mean()), 'std': float(np.std(x, ddof=1)), 'median': float(median),
+            'q5': float(q5), 'q95': float(q95)}
+
+
+def risk_density(nohedge, hedge, n_grid=500, rule='scott', bins=4096):
+    """套保前后两组周期盈亏的密度曲线与统计量。
+
+    网格沿用原版 [min·1.1, max·1.1] 的 n_grid 点等距划分；样本不足两个或没有波动时返回 None。
+    """
+    nohedge = np.asarray(nohedge, dtype=np.float64)
+    hedge = np.asarray(hedge, dtype=np.float64)
+    nohedge, hedge = nohedge[~np.isnan(nohedge)], hedge[~np.isnan(hedge)]
+    if len(nohedge) < 2 or len(hedge) < 2 or np.ptp(nohedge) == 0 or np.ptp(hedge) == 0:
+        return None
+    x_min = min(nohedge.min(), hedge.min()) * 1.1
+    x_max = max(nohedge.max(), hedge.max()) * 1.1
+    grid = np.linspace(x_min, x_max, n_grid)
+    return {
+        'grid': grid,
+        'nohedge': dict(density=fft_kde(nohedge, grid, rule, bins), **summary_stats(nohedge)),
+        'hedge': dict(density=fft_kde(hedge, grid, rule, bins), **summary_stats(hedge)),
+    }
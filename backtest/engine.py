@@ -0,0 +1,422 @@
+"""保证金账户模拟引擎。
+
+把 process_data 里逐行推进的账户逻辑抽成可插拔的引擎：
+
+- ``reference``: 原版逐行循环 (保留作为对照基准)
+- ``array``:     与账户状态无关的部分 (价差盈亏、成交成本、保证金与补金 / 提盈线) 先按列
+                 用 numpy 算好，Python 循环里只剩权益累加与补金 / 提盈判断
+- ``numba``:     账户内核经 Numba 编译 (可选依赖，未安装时自动回退到 array)
+
+三个引擎的浮点运算顺序完全一致，结果逐位相同。array / numba 还支持从上一段的
+期末状态 (权益、最后价格) 续算，以及逐行变化的套保比例；分段推进与一次性推进的
+结果同样逐位相同。换月、手续费 / 滑点与分段保证金率 (见 backtest.costs) 在两个引擎里
+按同样的顺序处理，不设置时与原公式逐位相同。
+"""
+import numpy as np
+
+ENGINES = ('reference', 'array', 'numba')
+RESULT_COLUMNS = ('Account_Equity', 'Margin_Required', 'Cash_Injection', 'Cash_Withdrawal', 'Risk_Degree')
+COST_COLUMNS = RESULT_COLUMNS + ('Trading_Cost',)
+
+
+# ==============================================================================
+# 1. 🧮 账户推进内核 (numba 编译；array 引擎按列展开同一套运算)
+# ==============================================================================
+def _account_kernel(prices, q, ratios, m_rates, inject_r, withdraw_r, rolls, unit_cost, current_equity, prev_price,
+                    prev_ratio, has_prev, equity, margin, cash_in, cash_out, risk, cost):
+    # ratios 为逐行套保比例：第 i 行结算的是第 i-1 行收盘后持有的头寸，保证金按调仓后的头寸计；
+    # 换月行 (rolls) 不结算与上一行的价差，成交成本在补金 / 提盈判断之前从权益中扣除；
+    # unit_cost 为 0 时不写 cost (调用方可传空数组)
+    n = len(prices)
+    for i in range(n):
+        price = prices[i]
+        held = 0.0
+        if i > 0:
+            held = q * ratios[i - 1]
+            if not rolls[i]:
+                current_equity += -(price - prices[i - 1]) * q * ratios[i - 1]
+        elif has_prev:
+            held = q * prev_ratio
+            if not rolls[i]:
+                current_equity += -(price - prev_price) * q * prev_ratio
+        fee = 0.0
+        if unit_cost > 0.0:
+            position = q * ratios[i]
+            if rolls[i]:
+                fee = (abs(held) + abs(position)) * unit_cost
+            else:
+                fee = abs(position - held) * unit_cost
+            current_equity -= fee
+            cost[i] = fee
+        req_margin = price * q * ratios[i] * m_rates[i]
+        thresh_low, thresh_high = req_margin * inject_r, req_margin * withdraw_r
+        in_amt, out_amt = 0.0, 0.0
+        if current_equity < thresh_low:
+            in_amt = thresh_low - current_equity
+            current_equity += in_amt
+        elif current_equity > thresh_high:
+            out_amt = current_equity - thresh_high
+            current_equity -= out_amt
+        margin[i] = req_margin
+        cash_in[i] = in_amt
+        cash_out[i] = out_amt
+        equity[i] = current_equity
+        risk[i] = (current_equity / req_margin) if req_margin > 0 else 0.0
+
+
+_numba_kernel = None
+
+
+def numba_available():
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_numba_kernel():
+    # Numba 导入与编译都较慢，首次使用时才加载
+    global _numba_kernel
+    if _numba_kernel is None:
+        import numba
+        _numba_kernel = numba.njit(cache=True, nogil=True)(_account_kernel)
+    return _numba_kernel
+
+
+# ==============================================================================
+# 2. 🔌 各引擎实现
+# ==============================================================================
+def _simulate_reference(prices, q, ratio, m_rate, inject_r, withdraw_r):
+    # 原版 process_data 循环，逐字保留
+    equity_list, margin_req_list, cash_in_list, cash_out_list, risk_degree_list = [], [], [], [], []
+    current_price = prices[0]
+    initial_equity = current_price * q * ratio * m_rate * inject_r
+    current_equity = initial_equity
+
+    for i in range(len(prices)):
+        price = prices[i]
+        if i > 0:
+            current_equity += -(price - prices[i - 1]) * q * ratio
+        req_margin = price * q * ratio * m_rate
+        margin_req_list.append(req_margin)
+        thresh_low, thresh_high = req_margin * inject_r, req_margin * withdraw_r
+        in_amt, out_amt = 0, 0
+        if current_equity < thresh_low:
+            in_amt = thresh_low - current_equity
+            current_equity += in_amt
+        elif current_equity > thresh_high:
+            out_amt = current_equity - thresh_high
+            current_equity -= out_amt
+        cash_in_list.append(in_amt)
+        cash_out_list.append(out_amt)
+        equity_list.append(current_equity)
+        risk_degree_list.append((current_equity / req_margin) if req_margin > 0 else 0)
+
+    return [np.asarray(v, dtype=np.float64) for v in
+            (equity_list, margin_req_list, cash_in_list, cash_out_list, risk_degree_list)]
+
+
+def _simulate_array(prices, q, ratios, m_rates, inject_r, withdraw_r, rolls, unit_cost, start_equity, prev_price,
+                    prev_ratio, has_prev, with_costs):
+    # 逐元素运算的顺序与内核一致，结果逐位相同；不结算的行 (首行建仓、换月) 加 -0.0，对任何权益都不改变取值
+    n = len(prices)
+    step = np.empty(n, dtype=np.float64)
+    step[1:] = -(prices[1:] - prices[:-1]) * q * ratios[:-1]
+    step[0] = -(prices[0] - prev_price) * q * prev_ratio if has_prev else -0.0
+    step[rolls] = -0.0
+    margin = prices * q * ratios * m_rates
+    thresh_low, thresh_high = margin * inject_r, margin * withdraw_r
+    cost = np.zeros(n if with_costs else 0, dtype=np.float64)
+    if unit_cost > 0.0:
+        held = np.empty(n, dtype=np.float64)
+        held[1:] = q * ratios[:-1]
+        held[0] = q * prev_ratio if has_prev else 0.0
+        position = q * ratios
+        cost[:] = np.where(rolls, (np.abs(held) + np.abs(position)) * unit_cost, np.abs(position - held) * unit_cost)
+
+    # 补金 / 提盈依赖截至上一行的权益，只能逐行推进；循环只记录调度前后的权益，补金 / 提盈额事后按列求出
+    before, after = [], []
+    record_before, record_after = before.append, after.append
+    current_equity = start_equity
+    if unit_cost > 0.0:
+        # 先加盈亏、再扣成本 (与内核相同的两次舍入)，不能合并成一个增量
+        rows = zip(step.tolist(), cost.tolist(), thresh_low.tolist(), thresh_high.tolist())
+    else:
+        rows = ((pnl, None, low, high) for pnl, low, high in zip(step.tolist(), thresh_low.tolist(),
+                                                                  thresh_high.tolist()))
+    for pnl, fee, low, high in rows:
+        current_equity += pnl
+        if fee is not None:
+            current_equity -= fee
+        record_before(current_equity)
+        if current_equity < low:
+            current_equity += low - current_equity
+        elif current_equity > high:
+            current_equity -= current_equity - high
+        record_after(current_equity)
+    before = np.asarray(before, dtype=np.float64)
+    equity = np.asarray(after, dtype=np.float64)
+    short = before < thresh_low
+    cash_in = np.where(short, thresh_low - before, 0.0)
+    cash_out = np.where(~short & (before > thresh_high), before - thresh_high, 0.0)
+    risk = np.zeros(n, dtype=np.float64)
+    np.divide(equity, margin, out=risk, where=margin > 0)
+    outs = [equity, margin, cash_in, cash_out, risk]
+    return outs + [cost] if with_costs else outs
+
+
+def _simulate_numba(prices, q, ratios, m_rates, inject_r, withdraw_r, rolls, unit_cost, start_equity, prev_price,
+                    prev_ratio, has_prev, with_costs):
+    n = len(prices)
+    outs = [np.empty(n, dtype=np.float64) for _ in RESULT_COLUMNS]
+    cost = np.zeros(n if with_costs else 0, dtype=np.float64)
+    _get_numba_kernel()(prices, float(q), ratios, m_rates, float(inject_r), float(withdraw_r), rolls,
+                        float(unit_cost), float(start_equity), float(prev_price), float(prev_ratio), bool(has_prev),
+                        *outs, cost)
+    return outs + [cost] if with_costs else outs
+
+
+_IMPLS = {
+    'reference': _simulate_reference,
+    'array': _simulate_array,
+    'numba': _simulate_numba,
+}
+
+
+def resolve_engine(engine='auto'):
+    """把 'auto' 解析为实际引擎：装了 Numba 用 numba，否则用 array。"""
+    if engine == 'auto':
+        return 'numba' if numba_available() else 'array'
+    if engine not in _IMPLS:
+        raise ValueError(f"未知的账户模拟引擎: {engine!r}，可选 {ENGINES}")
+    if engine == 'numba' and not numba_available():
+        return 'array'
+    return engine
+
+
+def _per_row(value, n, name, dtype=np.float64):
+    # 标量展开为步长为 0 的只读视图：内核照常逐行取值，但不分配、不写满整列内存
+    if np.ndim(value) > 0:
+        arr = np.ascontiguousarray(value, dtype=dtype)
+        if len(arr) != n:
+            raise ValueError(f"逐行{name}的长度必须与价格序列一致")
+        return arr
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (n,))
+
+
+def simulate_account(futures, q, ratio, m_rate, inject_r, withdraw_r, engine='auto',
+                     start_equity=None, prev_price=None, prev_ratio=None, rolls=None, unit_cost=0.0):
+    """按期货价格序列推进保证金账户。
+
+    ratio 可以是标量，也可以是与 futures 等长的逐行套保比例 (动态套保，见 backtest.hedge)；
+    m_rate 同样可以是逐行的保证金率。标量与填满同一数值的数组结果逐位相同。
+    start_equity / prev_price / prev_ratio 为上一段的期末权益、最后一个期货价格与最后一行的
+    套保比例，传入时从该状态续算 (首行先结算相对 prev_price 的盈亏)；不传则按首行价格建仓。
+    rolls 为逐行换月标记 (bool)，unit_cost 为每单位头寸成交一次的成本 (见 backtest.costs)。
+    续算、逐行参数与换月 / 成本都不走 reference 引擎。
+    返回 dict，键为 RESULT_COLUMNS，值为等长 float64 数组；传入 rolls 或 unit_cost 时
+    另有逐行成交成本 Trading_Cost。
+    """
+    prices = np.ascontiguousarray(futures, dtype=np.float64)
+    with_costs = rolls is not None or unit_cost > 0
+    columns = COST_COLUMNS if with_costs else RESULT_COLUMNS
+    if len(prices) == 0:
+        return {c: np.empty(0, dtype=np.float64) for c in columns}
+    engine = resolve_engine(engine)
+    dynamic = np.ndim(ratio) > 0
+    ratios = _per_row(ratio, len(prices), '套保比例')
+    m_rates = _per_row(m_rate, len(prices), '保证金率')
+    rolls = _per_row(False if rolls is None else rolls, len(prices), '换月标记', np.bool_)
+    if start_equity is None:
+        if engine == 'reference' and not dynamic and np.ndim(m_rate) == 0 and not with_costs:
+            outs = _simulate_reference(prices, q, ratio, m_rate, inject_r, withdraw_r)
+            return dict(zip(RESULT_COLUMNS, outs))
+        start_equity = prices[0] * q * ratios[0] * m_rates[0] * inject_r
+    if engine == 'reference':
+        engine = 'array'
+    has_prev = prev_price is not None
+    if prev_ratio is None:
+        prev_ratio = ratios[0] if dynamic else ratio
+    outs = _IMPLS[engine](prices, q, ratios, m_rates, inject_r, withdraw_r, rolls, float(unit_cost), start_equity,
+                          prev_price if has_prev else 0.0, prev_ratio, has_prev, with_costs)
+    return dict(zip(columns, outs))
+
+
+# ==============================================================================
+# 3. 🧱 批量内核：多情景并列为数组列，一遍时间循环同时推进
+# ==============================================================================
+# 只输出逐情景的汇总量，避免 (行数 × 情景数) 的全量矩阵占满内存
+BATCH_STATS = (
+    'value_mean', 'value_std', 'value_min',          # 套保后价值变动 (Value_Change_Hedged)
+    'total_injection', 'total_withdrawal',
+    'injection_count', 'withdrawal_count',
+    'peak_net_funding',                              # 累计 (补金 - 提盈) 的峰值
+    'min_pre_risk',                                  # 补金前的最低风险度
+    'idle_mean',                                     # 调度后权益超出保证金要求的部分 (闲置资金) 的逐行均值
+)
+
+
+def _batch_kernel(spot, futures, q, ratio, m_rate, inject_r, withdraw_r, out):
+    n = futures.shape[0]
+    s_count = ratio.shape[0]
+    multi_f = futures.shape[1] > 1
+    multi_s = spot.shape[1] > 1
+    equity = np.empty(s_count)
+    base = np.empty(s_count)
+    cum_in = np.zeros(s_count)
+    cum_out = np.zeros(s_count)
+    cnt = np.zeros(s_count)
+    mean = np.zeros(s_count)
+    m2 = np.zeros(s_count)
+    vmin = np.full(s_count, np.inf)
+    n_in = np.zeros(s_count)
+    n_out = np.zeros(s_count)
+    peak = np.zeros(s_count)
+    min_risk = np.full(s_count, np.inf)
+    idle = np.zeros(s_count)
+    for j in range(s_count):
+        jf = j if multi_f else 0
+        js = j if multi_s else 0
+        equity[j] = futures[0, jf] * q * ratio[j] * m_rate[j] * inject_r[j]
+        base[j] = (spot[0, js] * q) + equity[j]
+    for i in range(n):
+        for j in range(s_count):
+            jf = j if multi_f else 0
+            js = j if multi_s else 0
+            price = futures[i, jf]
+            if i > 0:
+                equity[j] += -(price - futures[i - 1, jf]) * q * ratio[j]
+            req_margin = price * q * ratio[j] * m_rate[j]
+            thresh_low, thresh_high = req_margin * inject_r[j], req_margin * withdraw_r[j]
+            if req_margin > 0:
+                pre_risk = equity[j] / req_margin
+                if pre_risk < min_risk[j]:
+                    min_risk[j] = pre_risk
+            if equity[j] < thresh_low:
+                in_amt = thresh_low - equity[j]
+                equity[j] += in_amt
+                cum_in[j] += in_amt
+                n_in[j] += 1
+            elif equity[j] > thresh_high:
+                out_amt = equity[j] - thresh_high
+                equity[j] -= out_amt
+                cum_out[j] += out_amt
+                n_out[j] += 1
+            if cum_in[j] - cum_out[j] > peak[j]:
+                peak[j] = cum_in[j] - cum_out[j]
+            idle[j] += equity[j] - req_margin
+            value = ((spot[i, js] * q) + equity[j] + (cum_out[j] - cum_in[j])) - base[j]
+            if value == value:
+                cnt[j] += 1
+                delta = value - mean[j]
+                mean[j] += delta / cnt[j]
+                m2[j] += delta * (value - mean[j])
+                if value < vmin[j]:
+                    vmin[j] = value
+    for j in range(s_count):
+        out[0, j] = mean[j] if cnt[j] > 0 else np.nan
+        out[1, j] = np.sqrt(m2[j] / (cnt[j] - 1)) if cnt[j] > 1 else np.nan
+        out[2, j] = vmin[j] if cnt[j] > 0 else np.nan
+        out[3, j] = cum_in[j]
+        out[4, j] = cum_out[j]
+        out[5, j] = n_in[j]
+        out[6, j] = n_out[j]
+        out[7, j] = peak[j]
+        out[8, j] = min_risk[j] if min_risk[j] < np.inf else np.nan
+        out[9, j] = idle[j] / n if n > 0 else np.nan
+
+
+def _batch_numpy(spot, futures, q, ratio, m_rate, inject_r, withdraw_r, out):
+    # 无 Numba 时的回退：时间方向逐行推进，情景方向整列向量化，逐元素运算顺序与内核一致
+    n = futures.shape[0]
+    s_count = ratio.shape[0]
+    equity = futures[0] * q * ratio * m_rate * inject_r
+    base = (spot[0] * q) + equity
+    cum_in = np.zeros(s_count)
+    cum_out = np.zeros(s_count)
+    cnt = np.zeros(s_count)
+    mean = np.zeros(s_count)
+    m2 = np.zeros(s_count)
+    vmin = np.full(s_count, np.inf)
+    n_in = np.zeros(s_count)
+    n_out = np.zeros(s_count)
+    peak = np.zeros(s_count)
+    min_risk = np.full(s_count, np.inf)
+    idle = np.zeros(s_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(n):
+            price = futures[i]
+            if i > 0:
+                equity = equity + (-(price - futures[i - 1]) * q * ratio)
+            req_margin = price * q * ratio * m_rate
+            thresh_low, thresh_high = req_margin * inject_r, req_margin * withdraw_r
+            pre_risk = np.where(req_margin > 0, equity / req_margin, np.inf)
+            min_risk = np.where(pre_risk < min_risk, pre_risk, min_risk)
+            low = equity < thresh_low
+            high = ~low & (equity > thresh_high)
+            in_amt = thresh_low - equity
+            out_amt = equity - thresh_high
+            equity = np.where(low, equity + in_amt, np.where(high, equity - out_amt, equity))
+            cum_in = np.where(low, cum_in + in_amt, cum_in)
+            cum_out = np.where(high, cum_out + out_amt, cum_out)
+            n_in += low
+            n_out += high
+            net_funding = cum_in - cum_out
+            peak = np.where(net_funding > peak, net_funding, peak)
+            idle = idle + (equity - req_margin)
+            value = ((spot[i] * q) + equity + (cum_out - cum_in)) - base
+            valid = value == value
+            cnt += valid
+            delta = np.where(valid, value - mean, 0.0)
+            mean = mean + np.where(valid, delta / np.maximum(cnt, 1), 0.0)
+            m2 = m2 + np.where(valid, delta * (value - mean), 0.0)
+            vmin = np.where(valid & (value < vmin), value, vmin)
+        out[0] = np.where(cnt > 0, mean, np.nan)
+        out[1] = np.where(cnt > 1, np.sqrt(m2 / (cnt - 1)), np.nan)
+        out[2] = np.where(cnt > 0, vmin, np.nan)
+    out[3], out[4], out[5], out[6], out[7] = cum_in, cum_out, n_in, n_out, peak
+    out[8] = np.where(min_risk < np.inf, min_risk, np.nan)
+    out[9] = idle / n if n > 0 else np.nan
+
+
+_numba_batch_kernel = None
+
+
+def _get_numba_batch_kernel():
+    global _numba_batch_kernel
+    if _numba_batch_kernel is None:
+        import numba
+        _numba_batch_kernel = numba.njit(cache=True, nogil=True)(_batch_kernel)
+    return _numba_batch_kernel
+
+
+def _as_2d(values):
+    arr = np.asarray(values, dtype=np.float64)
+    return np.ascontiguousarray(arr.reshape(len(arr), -1))
+
+
+def simulate_account_batch(spot, futures, q, ratio, m_rate, inject_r, withdraw_r, engine='auto'):
+    """一次推进多个情景的保证金账户，只返回逐情景的汇总指标。
+
+    spot / futures 可以是一维 (所有情景共用一条价格路径) 或 (行数, 情景数) 的二维数组；
+    ratio / m_rate / inject_r / withdraw_r 可为标量或长度为情景数的数组，自动广播。
+    返回 dict，键为 BATCH_STATS，值为长度为情景数的 float64 数组。
+    """
+    spot2, fut2 = _as_2d(spot), _as_2d(futures)
+    if spot2.shape[0] != fut2.shape[0]:
+        raise ValueError("现货与期货序列长度不一致")
+    params = np.broadcast_arrays(*(np.atleast_1d(np.asarray(p, dtype=np.float64))
+                                   for p in (ratio, m_rate, inject_r, withdraw_r)))
+    s_count = max(len(params[0]), spot2.shape[1], fut2.shape[1])
+    ratio_a, m_rate_a, inject_a, withdraw_a = (np.ascontiguousarray(np.broadcast_to(p, (s_count,))) for p in params)
+    for arr in (spot2, fut2):
+        if arr.shape[1] not in (1, s_count):
+            raise ValueError("价格路径列数必须为 1 或情景数")
+    out = np.full((len(BATCH_STATS), s_count), np.nan)
+    if fut2.shape[0] > 0:
+        if resolve_engine(engine) == 'numba':
+            _get_numba_batch_kernel()(spot2, fut2, float(q), ratio_a, m_rate_a, inject_a, withdraw_a, out)
+        else:
+            _batch_numpy(spot2, fut2, float(q), ratio_a, m_rate_a, inject_a, withdraw_a, out)
+    return dict(zip(BATCH_STATS, out))
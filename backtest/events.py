@@ -0,0 +1,99 @@
+"""资金调度事件日志：补金 / 提盈事件的紧凑列式记录。
+
+账户推进完成后直接从补金 / 提盈数组取出事件行 (一次向量化扫描)，只保存
+(行号, 时间, 类型, 金额, 账户权益) 五列定长数组。图表标记、统计注释、明细表与
+Excel 工作表都从这里读取，不再对整张结果表做布尔筛选；明细表按页格式化，
+事件再多也只处理当前页。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+INJECTION, WITHDRAWAL = 1, 2
+EVENT_LABELS = {INJECTION: '🔴 补金', WITHDRAWAL: '🟢 提盈'}
+EVENT_REASONS = {INJECTION: '账户权益低于补金警戒线', WITHDRAWAL: '账户权益高于提盈触发线'}
+TABLE_COLUMNS = ('时间', '类型', '金额(万)', '账户权益(万)', '触发原因')
+
+
+@dataclass(frozen=True)
+class EventLog:
+    """按行号升序排列的事件；index 为结果表中的行号 (续算时为全历史行号)。"""
+    index: np.ndarray    # int64
+    date: np.ndarray     # datetime64
+    kind: np.ndarray     # int8，INJECTION / WITHDRAWAL
+    amount: np.ndarray   # float64，补金或提盈金额 (元，恒为正)
+    equity: np.ndarray   # float64，调度后的账户权益 (元)
+
+    @classmethod
+    def from_account(cls, dates, cash_in, cash_out, equity, offset=0):
+        """从账户推进结果中取出事件；同一行不会既补金又提盈。"""
+        cash_in = np.asarray(cash_in, dtype=np.float64)
+        cash_out = np.asarray(cash_out, dtype=np.float64)
+        rows = np.flatnonzero((cash_in > 0) | (cash_out > 0))
+        is_in = cash_in[rows] > 0
+        return cls(
+            index=rows.astype(np.int64) + offset,
+            date=np.asarray(dates)[rows],
+            kind=np.where(is_in, INJECTION, WITHDRAWAL).astype(np.int8),
+            amount=np.where(is_in, cash_in[rows], cash_out[rows]),
+            equity=np.asarray(equity, dtype=np.float64)[rows],
+        )
+
+    @classmethod
+    def from_frame(cls, df, offset=0):
+        return cls.from_account(df['Date'].to_numpy(), df['Cash_Injection'].to_numpy(),
+                                df['Cash_Withdrawal'].to_numpy(), df['Account_Equity'].to_numpy(), offset)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, 'datetime64[ns]'), np.empty(0, np.int8),
+                   np.empty(0, np.float64), np.empty(0, np.float64))
+
+    @classmethod
+    def concat(cls, logs):
+        logs = list(logs)
+        if not logs:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(log, f) for log in logs]) for f in cls.__dataclass_fields__))
+
+    def __len__(self):
+        return len(self.index)
+
+    def take(self, selector):
+        return EventLog(*(getattr(self, f)[selector] for f in self.__dataclass_fields__))
+
+    def of_kind(self, kind):
+        return self.take(self.kind == kind)
+
+    def between(self, start, end):
+        """时间落在闭区间 [start, end] 内的事件 (按时间二分查找)。"""
+        i0 = np.searchsorted(self.date, np.datetime64(pd.Timestamp(start)), 'left')
+        i1 = np.searchsorted(self.date, np.datetime64(pd.Timestamp(end)), 'right')
+        return self.take(slice(i0, i1))
+
+    def count(self, kind):
+        return int(np.count_nonzero(self.kind == kind))
+
+    def total(self, kind):
+        return float(self.amount[self.kind == kind].sum())
+
+    def to_frame(self):
+        """原始数值形式的事件表 (一行一个事件)。"""
+        return pd.DataFrame({'Row': self.index, 'Date': self.date, 'Type': self.kind,
+                             'Amount': self.amount, 'Account_Equity': self.equity})
+
+    def table(self, start=0, stop=None):
+        """资金调度明细表 (按时间倒序) 的第 [start, stop) 行；只格式化这一段。"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(max(start, 0), stop)
+        # 倒序中的第 k 行即正序中的第 n-1-k 行
+        page = self.take(np.arange(len(self) - 1 - start, len(self) - 1 - stop, -1))
+        sign = np.where(page.kind == INJECTION, '+', '-')
+        return pd.DataFrame({
+            '时间': page.date,
+            '类型': [EVENT_LABELS[k] for k in page.kind],
+            '金额(万)': [f"{s}{v/10000:.2f}" for s, v in zip(sign, page.amount)],
+            '账户权益(万)': [f"{v/10000:.2f}" for v in page.equity],
+            '触发原因': [EVENT_REASONS[k] for k in page.kind],
+        }, columns=list(TABLE_COLUMNS))
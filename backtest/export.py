@@ -0,0 +1,135 @@
+"""回测报告导出：按块流式写出，内存占用与回测行数无关。
+
+- ``xlsx``:    openpyxl 只写模式逐行写入；单表超过 Excel 行数上限时自动续写到下一个工作表
+- ``csv.gz``:  分块写入 gzip 压缩的 UTF-8 (带 BOM，Excel 可直接打开) CSV
+- ``parquet``: 分块写入 Parquet 行组 (需要 pyarrow)
+
+CSV / Parquet 只包含回测明细；资金调度明细只写入 xlsx 报告的独立工作表。
+"""
+import gzip
+
+import pandas as pd
+
+from .events import EventLog
+
+EXPORT_FORMATS = {
+    'xlsx': ('套期保值回测报告.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv.gz': ('套期保值回测数据.csv.gz', 'application/gzip'),
+    'parquet': ('套期保值回测数据.parquet', 'application/vnd.apache.parquet'),
+}
+EXCEL_MAX_ROWS = 1_048_576   # 含表头
+CHUNK_ROWS = 50_000
+
+
+def available_formats():
+    """当前环境可用的导出格式 (缺少 pyarrow 时不提供 parquet)。"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return [f for f in EXPORT_FORMATS if f != 'parquet']
+    return list(EXPORT_FORMATS)
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _cell_rows(chunk):
+    # 缺失值写成空单元格 (与 DataFrame.to_excel 一致)，时间列保持为 Timestamp
+    values = chunk.to_numpy(dtype=object)
+    values[chunk.isna().to_numpy()] = None
+    return values.tolist()
+
+
+def write_excel(target, sheets, chunk_rows=CHUNK_ROWS):
+    """sheets 为 {工作表名: DataFrame}；超过行数上限的表拆成 名称、名称_2、名称_3 ……"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    per_sheet = EXCEL_MAX_ROWS - 1
+    for name, df in sheets.items():
+        for part, start in enumerate(range(0, max(len(df), 1), per_sheet), start=1):
+            ws = wb.create_sheet(name if part == 1 else f'{name}_{part}'[:31])
+            ws.append([str(c) for c in df.columns])
+            for chunk in _chunks(df.iloc[start:start + per_sheet], chunk_rows):
+                for row in _cell_rows(chunk):
+                    ws.append(row)
+    wb.save(target)
+
+
+class StreamWriter:
+    """逐块追加写出 csv.gz / parquet 文件，供分块回测边算边写 (结果不在内存中拼接)。
+
+    用作上下文管理器：with StreamWriter(path, 'csv.gz') as w: w.write(chunk)
+    """
+
+    def __init__(self, target, fmt='csv.gz', chunk_rows=CHUNK_ROWS):
+        if fmt not in ('csv.gz', 'parquet'):
+            raise ValueError(f"只有 csv.gz / parquet 支持分块写出，收到 {fmt!r}")
+        self.target, self.fmt, self.chunk_rows = target, fmt, chunk_rows
+        self._file = self._writer = self._schema = None
+        self.rows = 0
+
+    def __enter__(self):
+        if self.fmt == 'csv.gz':
+            # 压缩级别取 gzip 命令行的默认值 6：体积与 9 相差无几，速度快数倍
+            self._file = gzip.open(self.target, 'wt', compresslevel=6, encoding='utf-8-sig', newline='')
+        return self
+
+    def write(self, df):
+        if self.fmt == 'csv.gz':
+            if df.empty and self._schema is None:
+                df.to_csv(self._file, index=False)       # 只有表头
+            for chunk in _chunks(df, self.chunk_rows):
+                chunk.to_csv(self._file, index=False, header=(self._schema is None))
+                self._schema = list(df.columns)
+                self.rows += len(chunk)
+            self._schema = list(df.columns)
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            self._schema = pa.Schema.from_pandas(df, preserve_index=False)
+            self._writer = pq.ParquetWriter(self.target, self._schema)
+        for chunk in _chunks(df, self.chunk_rows):
+            self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+            self.rows += len(chunk)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def write_csv_gz(target, df, chunk_rows=CHUNK_ROWS):
+    with StreamWriter(target, 'csv.gz', chunk_rows) as writer:
+        writer.write(df)
+
+
+def write_parquet(target, df, chunk_rows=CHUNK_ROWS):
+    with StreamWriter(target, 'parquet', chunk_rows) as writer:
+        writer.write(df)
+
+
+def event_table(df):
+    """回测结果中的资金调度明细表 (按时间倒序)；没有任何事件时返回 None。"""
+    events = EventLog.from_frame(df)
+    return events.table() if len(events) else None
+
+
+def write_report(target, df, event_df=None, fmt='xlsx', chunk_rows=CHUNK_ROWS):
+    """把回测结果写到 target (路径或可写的二进制文件对象)。"""
+    if fmt == 'xlsx':
+        sheets = {'回测数据': df}
+        if event_df is not None:
+            sheets['资金调度明细'] = event_df
+        write_excel(target, sheets, chunk_rows)
+    elif fmt == 'csv.gz':
+        write_csv_gz(target, df, chunk_rows)
+    elif fmt == 'parquet':
+        write_parquet(target, df, chunk_rows)
+    else:
+        raise ValueError(f"未知的导出格式: {fmt!r}，可选 {tuple(EXPORT_FORMATS)}")
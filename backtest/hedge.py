@@ -0,0 +1,135 @@
+"""动态套保比例：滚动最小方差 (OLS) 与 EWMA 估计，逐行给出期货头寸对应的套保比例。
+
+最小方差套保比例 h = Cov(ΔS, ΔF) / Var(ΔF)，ΔS / ΔF 为相邻两行的现货 / 期货价格变动。
+
+- ``rolling``: 最近 window 个变动上的样本协方差 / 方差。对 (ΔS, ΔF, ΔS·ΔF, ΔF²) 做前缀和，
+  窗口和 = 两个前缀和之差，每行 O(1)，不对窗口重新拟合
+- ``ewma``:    ΔS·ΔF 与 ΔF² 的指数加权均值之比 (按 RiskMetrics 惯例视变动均值为 0)，
+  每行一次递推
+
+第 i 行的比例只用到第 i 行及之前的价格，作为第 i 行收盘后持有的头寸。预热期 (变动数
+不足 window 或半衰期) 用侧边栏的静态比例；方差为 0 等无法估计的行沿用上一行的比例，
+最后截断到 [lower, upper]。hedge_ratios 返回的状态可用于追加数据时续算，与整段计算逐位相同。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+HEDGE_MODES = ('static', 'rolling', 'ewma')
+HEDGE_LABELS = {'static': '静态 (固定比例)', 'rolling': '滚动最小方差', 'ewma': 'EWMA 最小方差'}
+
+
+@dataclass(frozen=True)
+class HedgeSpec:
+    """动态套保设置；可哈希，直接作为缓存键的一部分。"""
+    mode: str = 'static'
+    window: int = 240          # rolling：窗口内的变动个数
+    halflife: float = 60.0     # ewma：半衰期 (行)
+    lower: float = 0.0
+    upper: float = 1.5
+
+    def __post_init__(self):
+        if self.mode not in HEDGE_MODES:
+            raise ValueError(f"未知的套保比例模式: {self.mode!r}，可选 {HEDGE_MODES}")
+        if self.mode == 'rolling' and self.window < 2:
+            raise ValueError("滚动窗口至少需要 2 个价格变动")
+        if self.mode == 'ewma' and self.halflife <= 0:
+            raise ValueError("EWMA 半衰期必须为正")
+        if self.lower > self.upper:
+            raise ValueError("套保比例下限不能高于上限")
+
+    @property
+    def dynamic(self):
+        return self.mode != 'static'
+
+    @property
+    def warmup(self):
+        """开始采用估计值所需的价格变动个数。"""
+        return self.window if self.mode == 'rolling' else max(1, int(np.ceil(self.halflife)))
+
+    def to_list(self):
+        return [self.mode, self.window, self.halflife, self.lower, self.upper]
+
+    @classmethod
+    def from_list(cls, data):
+        mode, window, halflife, lower, upper = data
+        return cls(mode, int(window), float(halflife), float(lower), float(upper))
+
+
+def _changes(spot, futures, state):
+    # 逐行变动 (ΔS, ΔF)；续算时首行相对上一段的最后价格，新数据集的首行记 0
+    prev_s = state['last_spot'] if state else np.nan
+    prev_f = state['last_futures'] if state else np.nan
+    ds = np.diff(spot, prepend=prev_s)
+    df = np.diff(futures, prepend=prev_f)
+    if not state:
+        ds[0] = df[0] = 0.0
+    return ds, df
+
+
+def _rolling_estimate(ds, df, window, state):
+    v = np.column_stack((ds, df, ds * df, df * df))
+    last = np.asarray(state['sums'], dtype=np.float64) if state else np.zeros(4)
+    prefix = np.cumsum(np.vstack((last, v)), axis=0)[1:]
+    # 前缀和的最近 window 行存在状态里，新行的窗口起点可能落在上一段
+    tail = np.asarray(state['prefix_tail'], dtype=np.float64).reshape(-1, 4) if state else np.zeros((1, 4))
+    joined = np.vstack((tail, prefix))
+    lag = np.arange(len(tail), len(joined)) - window
+    start = joined[np.maximum(lag, 0)]
+    sx, sy, sxy, syy = (prefix - start).T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / window
+        var = syy - sy * sy / window
+        estimate = cov / var
+    # 价格长时间不动 (停牌、涨跌停) 时方差只剩舍入误差，视为无法估计
+    estimate[~(var > 1e-12 * syy)] = np.nan
+    return estimate, {'sums': prefix[-1].tolist(), 'prefix_tail': joined[-window:].ravel().tolist()}
+
+
+def _ewma(values, alpha, last):
+    # 续算时把上一段的期末均值放在首位作为递推初值，与整段递推逐位相同
+    if last is not None:
+        values = np.concatenate(([last], values))
+    mean = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return mean[1:] if last is not None else mean
+
+
+def _ewma_estimate(ds, df, halflife, state):
+    alpha = 1 - 0.5 ** (1 / halflife)
+    skip = 0 if state else 1            # 新数据集的首行没有变动，不参与递推
+    exy = _ewma((ds * df)[skip:], alpha, state.get('exy') if state else None)
+    eyy = _ewma((df * df)[skip:], alpha, state.get('eyy') if state else None)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimate = exy / eyy
+    estimate[~(eyy > 0)] = np.nan
+    estimate = np.concatenate(([np.nan] * skip, estimate))
+    new_state = {'exy': float(exy[-1]), 'eyy': float(eyy[-1])} if len(exy) else dict(state or {})
+    return estimate, new_state
+
+
+def hedge_ratios(spot, futures, spec, fallback, state=None):
+    """逐行套保比例。返回 (与价格等长的 float64 数组, 续算状态 dict)。
+
+    fallback 为预热期使用的静态比例；state 为上一段返回的状态，None 表示从首行开始。
+    """
+    spot = np.asarray(spot, dtype=np.float64)
+    futures = np.asarray(futures, dtype=np.float64)
+    if not spec.dynamic:
+        return np.full(len(futures), fallback, dtype=np.float64), None
+    ds, df = _changes(spot, futures, state)
+    if spec.mode == 'rolling':
+        estimate, est_state = _rolling_estimate(ds, df, spec.window, state)
+    else:
+        estimate, est_state = _ewma_estimate(ds, df, spec.halflife, state)
+
+    seen = state['seen'] if state else 0
+    n_changes = seen + np.arange(len(futures)) + (1 if state else 0)
+    estimate[n_changes < spec.warmup] = np.nan
+    last_ratio = state['last_ratio'] if state else fallback
+    ratios = pd.Series(np.concatenate(([last_ratio], estimate))).ffill().to_numpy()[1:]
+    ratios = np.clip(ratios, spec.lower, spec.upper)
+    if len(futures):
+        est_state.update(seen=int(n_changes[-1]), last_spot=float(spot[-1]), last_futures=float(futures[-1]),
+                         last_ratio=float(ratios[-1]))
+    return ratios, est_state
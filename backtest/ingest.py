@@ -0,0 +1,365 @@
+"""行情 CSV 读取与标准化：识别 时间/现货/期货 列，统一为 Date / Spot / Futures。
+
+load_market_data 是带缓存的入口：按上传内容的指纹查找磁盘上的 Arrow 缓存，
+命中时直接内存映射读取，未命中才解析 CSV (只探测一次编码、显式列类型与日期格式)。
+
+超过 CHUNKED_INGEST_BYTES 的文件走分块路径 (load_market_file)：按 CHUNK_ROWS 行一块
+读取、标准化后逐块写成 Arrow 记录批，指纹也按块计算，解析阶段的内存只与块大小有关；
+iter_cached_chunks 再按记录批逐块读回，配合 core.backtest_chunks 做全程分块的回测。
+"""
+import codecs
+import hashlib
+import io
+import os
+import threading
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+CACHE_DIR_ENV = 'HEDGE_CACHE_DIR'
+CACHE_MAX_BYTES = int(float(os.environ.get('HEDGE_CACHE_MB', 4096)) * 2 ** 20)
+MARKET_COLUMNS = ['Date', 'Spot', 'Futures']
+CHUNK_ROWS = int(os.environ.get('HEDGE_INGEST_CHUNK_ROWS', 1_000_000))
+CHUNKED_INGEST_BYTES = int(os.environ.get('HEDGE_CHUNKED_INGEST_BYTES', 256 << 20))
+_SNIFF_BYTES = 1 << 20
+_HASH_BLOCK = 8 << 20
+
+
+def detect_columns(columns):
+    """按原版规则模糊匹配列名，返回 (时间列, 现货列, 期货列)，缺失的为 None。"""
+    col_time = next((c for c in columns if '时间' in c or 'Date' in c), None)
+    col_spot = next((c for c in columns if '现货' in c), None)
+    col_fut = next((c for c in columns if ('期货' in c or '主力' in c) and '价格' in c), None)
+    return col_time, col_spot, col_fut
+
+
+# ==============================================================================
+# 1. 🔍 指纹 / 编码 / 日期格式探测
+# ==============================================================================
+def fingerprint(data):
+    """上传内容的指纹，用作磁盘缓存与结果缓存的键。"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint_file(f):
+    """按块计算已打开文件的指纹，与对整段字节调用 fingerprint 相同；读完后回到文件开头。"""
+    digest = hashlib.blake2b(digest_size=16)
+    f.seek(0)
+    for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def detect_encoding(data):
+    """只看文件开头一段：有 BOM 或能按 UTF-8 解码就是 UTF-8，否则按 GBK 系 (GB18030 兼容 GBK)。"""
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data[:_SNIFF_BYTES], final=False)
+    except UnicodeDecodeError:
+        return 'gb18030'
+    return 'utf-8'
+
+
+def detect_date_format(values):
+    """用前若干个非空样本猜测日期格式，样本之间不一致时返回 None (交给 pandas 逐个推断)。"""
+    samples = [str(v).strip() for v in values if pd.notna(v) and str(v).strip()][:50]
+    if not samples:
+        return None
+    fmt = guess_datetime_format(samples[0])
+    if fmt is None:
+        return None
+    try:
+        pd.to_datetime(pd.Series(samples), format=fmt)
+    except (ValueError, TypeError):
+        return None
+    return fmt
+
+
+# ==============================================================================
+# 2. 📥 显式类型解析
+# ==============================================================================
+def _layout(data_source, encoding):
+    # 表头里识别三列，返回 (原始列名, 改名映射)；识别不到时返回 None
+    header = pd.read_csv(data_source, encoding=encoding, nrows=0)
+    columns = [str(c).strip() for c in header.columns]
+    col_time, col_spot, col_fut = detect_columns(columns)
+    if not (col_time and col_spot and col_fut):
+        return None
+    raw_names = dict(zip(columns, header.columns))
+    usecols = [raw_names[col_time], raw_names[col_spot], raw_names[col_fut]]
+    rename = {raw_names[col_time]: 'Date', raw_names[col_spot]: 'Spot', raw_names[col_fut]: 'Futures'}
+    return usecols, rename
+
+
+def _coerce_prices(raw, usecols):
+    # 原版的逐值容错转换：去掉千分位后无法解析的记为 NaN；全为整数的列同样转成 float64，与快速路径一致
+    for col in usecols[1:]:
+        raw[col] = pd.to_numeric(raw[col].str.replace(',', ''), errors='coerce').astype('float64')
+    return raw
+
+
+def _normalize(raw, rename, date_format):
+    raw = raw.rename(columns=rename)[MARKET_COLUMNS]
+    raw['Date'] = pd.to_datetime(raw['Date'], format=date_format)
+    return raw
+
+
+def parse_market_csv(data, encoding=None):
+    """一次性解析 CSV：只读需要的三列，价格列按 float64 + 千分位解析，日期按探测到的格式解析。"""
+    encoding = encoding or detect_encoding(data)
+    layout = _layout(io.BytesIO(data), encoding)
+    if layout is None:
+        return None
+    usecols, rename = layout
+
+    read_kwargs = dict(encoding=encoding, usecols=usecols, thousands=',')
+    try:
+        raw = pd.read_csv(io.BytesIO(data), dtype={usecols[0]: str, usecols[1]: 'float64', usecols[2]: 'float64'},
+                          **read_kwargs)
+    except ValueError:
+        # 价格列夹杂无法解析的文本时，退回原版的逐值容错转换
+        raw = _coerce_prices(pd.read_csv(io.BytesIO(data), dtype=str, **read_kwargs), usecols)
+    raw = _normalize(raw, rename, detect_date_format(raw[usecols[0]].head(50)))
+    return raw.sort_values('Date').reset_index(drop=True)
+
+
+def iter_market_chunks(f, encoding=None, chunk_rows=CHUNK_ROWS):
+    """分块解析已打开的 (可 seek 的二进制) CSV，逐块产出标准化后的 Date/Spot/Futures 表 (文件原顺序)。
+
+    编码与日期格式只在文件开头探测一次；表头识别不到三列时不产出任何块。价格列在某一块
+    遇到无法解析的文本时，从这一块起改为按文本读取、逐值容错转换，已产出的块不受影响。
+    """
+    f.seek(0)
+    encoding = encoding or detect_encoding(f.read(_SNIFF_BYTES))
+    f.seek(0)
+    layout = _layout(f, encoding)
+    if layout is None:
+        return
+    usecols, rename = layout
+    read_kwargs = dict(encoding=encoding, usecols=usecols, thousands=',', chunksize=chunk_rows)
+
+    typed = {usecols[0]: str, usecols[1]: 'float64', usecols[2]: 'float64'}
+    done, date_format, lenient = 0, None, False
+    f.seek(0)
+    reader = pd.read_csv(f, dtype=typed, **read_kwargs)
+    while True:
+        try:
+            raw = next(reader, None)
+        except ValueError:
+            if lenient:
+                raise
+            # 从出错的这一块起按文本读取：跳过表头之后已经产出的 done 行
+            reader.close()
+            lenient = True
+            f.seek(0)
+            reader = pd.read_csv(f, dtype=str, skiprows=lambda i, n=done: 0 < i <= n, **read_kwargs)
+            continue
+        if raw is None:
+            reader.close()
+            return
+        if lenient:
+            raw = _coerce_prices(raw, usecols)
+        if date_format is None:
+            date_format = detect_date_format(raw[usecols[0]].head(50)) or ''
+        done += len(raw)
+        yield _normalize(raw, rename, date_format or None)
+
+
+# ==============================================================================
+# 3. 💾 Arrow 磁盘缓存 (内存映射读取)
+# ==============================================================================
+# 每个上传内容一个 <指纹>.arrow 文件；每次写入后按最近使用时间 (命中时刷新的修改时间) 淘汰，
+# 总大小不超过 HEDGE_CACHE_MB (默认 4096)
+def default_cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'hedge_backtest')
+
+
+def _cache_path(fp, cache_dir):
+    return os.path.join(cache_dir, 'ingest', f'{fp}.arrow')
+
+
+def _touch(path):
+    # 命中时刷新修改时间，淘汰按它判断最近使用
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_cache(cache_dir=None, max_bytes=None, keep=None):
+    """按最近使用时间淘汰 Arrow 缓存，使总大小不超过 max_bytes (默认 HEDGE_CACHE_MB)；
+    最近使用的一个 (以及 keep 指定的文件) 总是保留。返回删除的文件数。"""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    folder = os.path.join(cache_dir or default_cache_dir(), 'ingest')
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.endswith('.arrow'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+    except OSError:
+        return 0
+    entries.sort(reverse=True)
+    total, removed = 0, 0
+    for rank, (_, path, size) in enumerate(entries):
+        total += size
+        if total > max_bytes and rank > 0 and path != keep:
+            # 已被内存映射的文件删除后映射仍然有效；Windows 上删不掉时留到下次
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _read_cache(path):
+    """内存映射读回缓存；各列直接引用映射的页面 (只读)，不在内存中另拷一份。
+
+    单个记录批的缓存 (整表写入) 三列都是零拷贝的，Date 列同样是 datetime64[us]；分块写入的
+    缓存由多个记录批组成，每列需要拼接成连续数组，这时会整体复制一次。映射随返回的表一起
+    释放，不能提前关闭。
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    if not os.path.exists(path):
+        return None
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    _touch(path)
+    return table.to_pandas(split_blocks=True)
+
+
+def _write_cache(frame, path):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # 先写临时文件再原子替换，多个会话同时上传同一文件时不会读到半截缓存
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    evict_cache(os.path.dirname(os.path.dirname(path)), keep=path)
+
+
+def _write_chunk_cache(chunks, path, chunk_rows=CHUNK_ROWS):
+    # 逐块写成 Arrow 记录批；返回是否写入了数据。各块首尾相接仍按时间有序时无需再排序，
+    # 否则 (极少见) 读回内存映射的表整体排序后重写
+    import pyarrow as pa
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    writer, schema, ordered, last = None, None, True, None
+    try:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            for chunk in chunks:
+                if schema is None:
+                    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                    writer = pa.ipc.new_file(sink, schema)
+                dates = chunk['Date']
+                if len(dates):
+                    ordered = ordered and dates.is_monotonic_increasing and (last is None or dates.iloc[0] >= last)
+                    last = dates.iloc[-1]
+                writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            return False
+        if not ordered:
+            with pa.memory_map(tmp_path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all().sort_by('Date')
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as resorted:
+                resorted.write_table(table, max_chunksize=chunk_rows)
+        os.replace(tmp_path, path)
+        evict_cache(os.path.dirname(os.path.dirname(path)), keep=path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_cached_frame(fp, cache_dir=None):
+    """只按指纹读取磁盘缓存，未缓存时返回 None。"""
+    try:
+        return _read_cache(_cache_path(fp, cache_dir or default_cache_dir()))
+    except (OSError, ValueError):
+        return None
+
+
+def iter_cached_chunks(fp, cache_dir=None):
+    """按记录批逐块读回磁盘缓存 (内存映射)，每块一张 Date/Spot/Futures 表；未缓存时不产出。"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    path = _cache_path(fp, cache_dir or default_cache_dir())
+    if not os.path.exists(path):
+        return
+    _touch(path)
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas()
+
+
+def spill_market_file(f, cache_dir=None, chunk_rows=CHUNK_ROWS):
+    """把已打开的二进制 CSV 分块解析并逐块写入 Arrow 缓存，返回 (内容指纹, 缓存是否可用)。
+
+    指纹按块计算，已缓存的内容不再解析；识别不到列或没有 pyarrow 时缓存不可用。
+    """
+    fp = fingerprint_file(f)
+    path = _cache_path(fp, cache_dir or default_cache_dir())
+    if os.path.exists(path):
+        _touch(path)
+        return fp, True
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return fp, False
+    return fp, _write_chunk_cache(iter_market_chunks(f, chunk_rows=chunk_rows), path, chunk_rows)
+
+
+def load_market_file(f, cache_dir=None, chunk_rows=CHUNK_ROWS):
+    """大文件的分块读取入口，f 为已打开的二进制文件 (或上传控件的文件对象)；返回值同 load_market_data。
+
+    解析阶段的峰值内存与文件大小无关 (见 spill_market_file)；没有 pyarrow 时退回在内存中拼接各块。
+    """
+    fp, cached = spill_market_file(f, cache_dir, chunk_rows)
+    frame = load_cached_frame(fp, cache_dir) if cached else None
+    if frame is not None:
+        return frame, fp
+    parts = list(iter_market_chunks(f, chunk_rows=chunk_rows))
+    if not parts:
+        return None, fp
+    return pd.concat(parts, ignore_index=True).sort_values('Date').reset_index(drop=True), fp
+
+
+def load_market_data(data, cache_dir=None):
+    """带磁盘缓存的读取入口，返回 (Date/Spot/Futures 表, 内容指纹)；识别不到列时表为 None。
+
+    超过 CHUNKED_INGEST_BYTES 的内容改走 load_market_file 的分块解析。
+    """
+    if len(data) > CHUNKED_INGEST_BYTES:
+        return load_market_file(io.BytesIO(data), cache_dir)
+    fp = fingerprint(data)
+    path = _cache_path(fp, cache_dir or default_cache_dir())
+    cached = load_cached_frame(fp, cache_dir)
+    if cached is not None:
+        return cached, fp
+    frame = parse_market_csv(data)
+    if frame is not None:
+        try:
+            _write_cache(frame, path)
+        except OSError:
+            pass
+    return frame, fp
@@ -0,0 +1,205 @@
+"""后台任务：耗时的回测 / 参数扫描在进程级线程池中运行，不占用 Streamlit 的脚本线程。
+
+任务以 (类型, 数据集句柄, 参数) 这样的可哈希键标识：多个会话提交同一个键时共用同一个
+任务，完成的任务留在有界 LRU 表里，之后任何会话再提交都直接拿到结果；失败的任务在
+下次提交时重跑。任务函数通过 progress 回调报告进度 (0~1) 与阶段性结果，页面据此轮询
+显示。账户推进的 Numba 内核释放 GIL，线程池即可并行。本模块不依赖 Streamlit。
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from . import compact, core, dataset
+from .costs import active_costs
+from .metrics import StreamingSummary
+from .store import get_store
+from .sweep import SWEEP_DIMS, run_sweep
+
+MAX_WORKERS = int(os.environ.get('HEDGE_JOB_WORKERS', 2))
+MAX_FINISHED = int(os.environ.get('HEDGE_JOB_RESULTS', 32))
+CHUNK_ROWS = int(os.environ.get('HEDGE_JOB_CHUNK_ROWS', 250_000))
+
+
+class Job:
+    """一个后台任务的状态；progress / message / partial 由任务函数在运行中更新。"""
+
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.message = ''
+        self.partial = None
+        self.submitted = time.time()
+        self.finished = None
+        self._future = None
+
+    def report(self, progress, message='', partial=None):
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    @property
+    def done(self):
+        return self._future.done()
+
+    @property
+    def failed(self):
+        return self.done and self._future.exception() is not None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.submitted
+
+    def wait(self, timeout=None):
+        """等待至多 timeout 秒，返回是否已完成。"""
+        wait([self._future], timeout=timeout)
+        return self.done
+
+    def result(self, timeout=None):
+        return self._future.result(timeout=timeout)
+
+
+class JobRunner:
+    """按键去重的线程池任务队列；已完成的任务按 LRU 最多保留 max_finished 个。"""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_finished=MAX_FINISHED):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def submit(self, key, fn, *args, **kwargs):
+        """提交 fn(*args, progress=回调, **kwargs)；同键的任务正在运行或已完成时直接返回它。"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.failed:
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key)
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+            self._jobs[key] = job
+            self._evict()
+        # 任务完成时再淘汰一次，没有新提交时已完成的任务数同样不超过上限 (已完成时回调在本线程立即执行，须在锁外登记)
+        job._future.add_done_callback(self._on_done)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def jobs(self):
+        """当前登记的全部任务 (由旧到新)，供诊断面板显示。"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        try:
+            result = fn(*args, progress=job.report, **kwargs)
+        finally:
+            job.finished = time.time()
+        job.report(1.0, '完成')
+        return result
+
+    def _on_done(self, future):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        # 只淘汰已完成的任务；运行中的任务无论多少都保留，避免重复提交
+        finished = [k for k, j in self._jobs.items() if j.done]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """进程内共享的任务队列 (所有会话共用)。"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
+
+
+# ==============================================================================
+# 任务函数：带进度回调的回测与参数扫描
+# ==============================================================================
+def compact_backtest(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine='auto', hedge=None,
+                     precision='float64', costs=None, progress=None, chunk_rows=CHUNK_ROWS, use_store=True):
+    """compact.compact_handle 的分块版：每 chunk_rows 行报告一次进度与截至当前的指标卡数值。
+
+    账户状态跨块续算 (core.backtest_chunks)，结果与一次性回测逐位相同。use_store 时先查
+    持久化结果库 (见 backtest.store)，算完后连同汇总指标写回，其他进程 / 重启后直接取用。
+    """
+    params = (q, ratio, m_rate, inject_r, withdraw_r, days)
+    costs = active_costs(costs)
+    store = get_store() if use_store else None
+    if store is not None:
+        try:
+            stored = store.load(handle, params, hedge, precision, costs)
+        except sqlite3.Error:
+            stored = None
+        if stored is not None:
+            return stored
+    result = _compact_backtest(handle, params, engine, hedge, precision, costs, progress, chunk_rows)
+    if store is not None:
+        try:
+            store.save(result, core.backtest_metrics(result.frame))
+        except sqlite3.Error:
+            pass                       # 结果库不可写 (磁盘满、被锁过久) 时只是不入库
+    return result
+
+
+def _compact_backtest(handle, params, engine, hedge, precision, costs, progress, chunk_rows):
+    q, ratio, m_rate, inject_r, withdraw_r, days = params
+    frame = dataset.resolve(handle)
+    if progress is None or len(frame) <= chunk_rows:
+        return compact.compact_handle(handle, q, ratio, m_rate, inject_r, withdraw_r, days, engine=engine,
+                                      hedge=hedge, precision=precision, costs=costs)
+    parts, summary = [], StreamingSummary()
+
+    def on_chunk(df):
+        parts.append(df)
+        summary.update(df['Value_Change_NoHedge'].to_numpy(), df['Value_Change_Hedged'].to_numpy(),
+                       df['Cash_Injection'].to_numpy(), df['Cash_Withdrawal'].to_numpy())
+        progress(summary.rows / len(frame), f'已回测 {summary.rows:,} / {len(frame):,} 行', summary.result())
+
+    chunks = (frame.iloc[i:i + chunk_rows] for i in range(0, len(frame), chunk_rows))
+    _, events, _ = core.backtest_chunks(chunks, q, ratio, m_rate, inject_r, withdraw_r, days, engine=engine,
+                                        hedge=hedge, on_chunk=on_chunk, costs=costs)
+    df = pd.concat(parts, ignore_index=True)
+    return compact.CompactResult.from_frame(handle, params, hedge, df, events, precision, costs)
+
+
+def sweep_handle(handle, q, m_rate, hedge_ratios, inject_ratios, withdraw_ratios, holding_days_list, engine='auto',
+                 progress=None, blocks=10):
+    """按句柄做参数网格扫描；按套保比例分块批量推进，每块报告一次进度与已完成部分的结果。
+
+    持仓周期以天计，按所在聚合级别换算为行数扫描，结果再换回天。各组合的账户互相独立，
+    分块结果拼接后与一次扫描全部组合相同。
+    """
+    df_input = dataset.resolve(handle)
+    spot, futures = df_input['Spot'].to_numpy(), df_input['Futures'].to_numpy()
+    per_day = dataset.holding_rows(handle, 1)
+    rows_list = [d * per_day for d in holding_days_list]
+    ratio_blocks = [b for b in np.array_split(np.asarray(hedge_ratios, dtype=np.float64), blocks) if len(b)]
+    parts = []
+    for k, ratio_block in enumerate(ratio_blocks or [np.empty(0)], start=1):
+        part = run_sweep(spot, futures, q, m_rate, ratio_block, inject_ratios, withdraw_ratios, rows_list,
+                         engine=engine)
+        part['holding_days'] = part['holding_days'] // per_day
+        parts.append(part)
+        if progress is not None:
+            progress(k / max(len(ratio_blocks), 1), f'已完成 {k} / {len(ratio_blocks)} 组套保比例',
+                     pd.concat(parts, ignore_index=True))
+    return pd.concat(parts, ignore_index=True).sort_values(list(SWEEP_DIMS), ignore_index=True)
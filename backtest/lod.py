@@ -0,0 +1,79 @@
+"""图表降采样 (level of detail)：把时间序列压缩到屏幕分辨率量级再交给浏览器。
+
+- ``lttb``:   Largest-Triangle-Three-Buckets，保留视觉形状
+- ``minmax``: 每个桶保留最小值与最大值，保证尖峰 / 极值不丢
+
+多条共用横轴的曲线取各自采样点的并集，保证它们仍然逐点对齐 (fill='tonexty' 依赖这一点)；
+keep 指定的行 (如补金 / 提盈事件) 无条件保留。
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ('lttb', 'minmax')
+
+
+def _as_numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """LTTB 采样，返回保留点的行号 (含首尾)。"""
+    x, y = _as_numeric(x), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # NaN 不参与面积比较，用相邻有效值代替，保证选点不被缺失值卡住
+    y = pd.Series(y).ffill().bfill().fillna(0.0).to_numpy()
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else x[-1]
+        avg_y = y[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else y[-1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_out):
+    """每个桶保留最小值与最大值所在的行 (约 n_out 个点，含首尾)。"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    pad = size * n_buckets - n
+    lo = np.concatenate((np.where(np.isnan(y), np.inf, y), np.full(pad, np.inf))).reshape(n_buckets, size)
+    hi = np.concatenate((np.where(np.isnan(y), -np.inf, y), np.full(pad, -np.inf))).reshape(n_buckets, size)
+    base = np.arange(n_buckets) * size
+    idx = np.concatenate((base + lo.argmin(axis=1), base + hi.argmax(axis=1), [0, n - 1]))
+    return np.unique(idx[idx < n])
+
+
+def downsample_indices(x, ys, n_out, method='lttb', keep=None):
+    """对共用横轴的多条曲线采样，返回排序去重后的行号并集。"""
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+    if method not in METHODS:
+        raise ValueError(f"未知的降采样方法: {method!r}，可选 {METHODS}")
+    parts = [lttb_indices(x, y, n_out) if method == 'lttb' else minmax_indices(y, n_out) for y in ys]
+    if keep is not None:
+        keep = np.asarray(keep)
+        parts.append(np.flatnonzero(keep) if keep.dtype == bool else keep.astype(np.int64))
+    return np.unique(np.concatenate(parts))
+
+
+def downsample_frame(df, columns, n_out, method='lttb', x='Date', keep=None):
+    """按 columns 各列的形状采样整张表 (行号取并集)，返回子表。"""
+    idx = downsample_indices(df[x].to_numpy(), [df[c].to_numpy() for c in columns], n_out, method, keep)
+    return df.iloc[idx]
@@ -0,0 +1,106 @@
+"""价值变动曲线与指标卡口径的汇总指标。"""
+import numpy as np
+import pandas as pd
+
+
+def initial_equity(first_futures, q, ratio, m_rate, inject_r):
+    """建仓时按补金警戒线注入的初始权益。"""
+    return first_futures * q * ratio * m_rate * inject_r
+
+
+def value_changes(spot, q, init_equity, equity, cash_in, cash_out,
+                  first_spot=None, cum_in0=0.0, cum_out0=0.0):
+    """返回 (未套保价值变动, 套保后价值变动)，运算顺序与 process_data 一致。
+
+    套保后资产 = 现货市值 + 账户权益 + 累计调仓净额 (提盈 - 补金)。
+    续算新追加的行时传入建仓时的现货价 first_spot 与此前的累计补金 / 提盈，
+    累加从上一段的累计值接着做，结果与整段一次性计算逐位相同。
+    """
+    spot = np.asarray(spot, dtype=np.float64)
+    if first_spot is None:
+        first_spot = spot[0]
+        cum_net_cash = np.cumsum(cash_out) - np.cumsum(cash_in)
+    else:
+        cum_net_cash = (np.cumsum(np.concatenate(([cum_out0], cash_out)))[1:]
+                        - np.cumsum(np.concatenate(([cum_in0], cash_in)))[1:])
+    base_asset = (first_spot * q) + init_equity
+    curr_asset = (spot * q) + equity + cum_net_cash
+    return (spot - first_spot) * q, curr_asset - base_asset
+
+
+def summary_metrics(value_no, value_hedged, cash_in, cash_out):
+    """指标卡上的四项数值 (单位：元，stability_boost 为百分比)。"""
+    std_raw = pd.Series(value_no).std()
+    std_hedge = pd.Series(value_hedged).std()
+    max_loss_no = pd.Series(value_no).min()
+    max_loss_hedge = pd.Series(value_hedged).min()
+    return {
+        'std_raw': std_raw,
+        'std_hedge': std_hedge,
+        'stability_boost': (1 - std_hedge / std_raw) * 100 if std_raw != 0 else 0,
+        'max_loss_no': max_loss_no,
+        'max_loss_hedge': max_loss_hedge,
+        'loss_saved': max_loss_hedge - max_loss_no,
+        'net_cash': pd.Series(cash_out).sum() - pd.Series(cash_in).sum(),
+    }
+
+
+class StreamingSummary:
+    """分块累计 backtest_metrics 的各项，内存与总行数无关。
+
+    标准差按 Chan 等人的并行合并公式逐块合并 (ddof=1，与 pandas 一致)，与一次性计算
+    只差舍入误差；最小值、次数与金额直接累加。
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self._moments = {'no': (0, 0.0, 0.0), 'hedged': (0, 0.0, 0.0)}   # (个数, 均值, 离差平方和)
+        self._min = {'no': np.inf, 'hedged': np.inf}
+        self.injection_count = self.withdrawal_count = 0
+        self.total_injection = self.total_withdrawal = 0.0
+
+    def _merge(self, key, values):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        n_a, mean_a, m2_a = self._moments[key]
+        n_b, mean_b = len(values), float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self._moments[key] = (n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n)
+        self._min[key] = min(self._min[key], float(values.min()))
+
+    def update(self, value_no, value_hedged, cash_in, cash_out):
+        cash_in = np.asarray(cash_in, dtype=np.float64)
+        cash_out = np.asarray(cash_out, dtype=np.float64)
+        self.rows += len(cash_in)
+        self._merge('no', np.asarray(value_no, dtype=np.float64))
+        self._merge('hedged', np.asarray(value_hedged, dtype=np.float64))
+        self.injection_count += int(np.count_nonzero(cash_in > 0))
+        self.withdrawal_count += int(np.count_nonzero(cash_out > 0))
+        self.total_injection += float(cash_in.sum())
+        self.total_withdrawal += float(cash_out.sum())
+
+    def _std(self, key):
+        n, _, m2 = self._moments[key]
+        return np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+
+    def result(self):
+        std_raw, std_hedge = self._std('no'), self._std('hedged')
+        min_no = self._min['no'] if self._moments['no'][0] else np.nan
+        min_hedge = self._min['hedged'] if self._moments['hedged'][0] else np.nan
+        return {
+            'std_raw': std_raw,
+            'std_hedge': std_hedge,
+            'stability_boost': (1 - std_hedge / std_raw) * 100 if std_raw != 0 else 0,
+            'max_loss_no': min_no,
+            'max_loss_hedge': min_hedge,
+            'loss_saved': min_hedge - min_no,
+            'net_cash': self.total_withdrawal - self.total_injection,
+            'rows': self.rows,
+            'injection_count': self.injection_count,
+            'withdrawal_count': self.withdrawal_count,
+            'total_injection': self.total_injection,
+            'total_withdrawal': self.total_withdrawal,
+        }
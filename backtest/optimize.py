@@ -0,0 +1,121 @@
+"""资金通道阈值优化：搜索补金警戒线 / 提盈触发线，使资金成本最低。
+
+资金成本 = 累计补金 + 每次调度的固定费用 × 调度次数 + 闲置资金的机会成本，
+其中闲置资金为调度后权益超出保证金要求的部分 (逐行均值)，机会成本按年化利率与
+回测覆盖的年数计。约束为补金前的风险度 (权益 / 保证金) 始终不低于 risk_floor。
+
+搜索采用逐轮收缩的网格 (pattern search)：每轮在当前区间内取 grid × grid 个候选，
+全部候选作为批量内核的情景列一次推进，并按线程切块并行 (Numba 内核释放 GIL)；
+下一轮以可行解中成本最低的点为中心把区间缩小一半。所有轮次评估过的可行候选再给出
+调度次数与闲置资金之间的 Pareto 前沿。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .engine import BATCH_STATS, simulate_account_batch
+
+OPT_METRICS = {
+    'funding_cost': '资金成本 (元)',
+    'total_injection': '累计补金 (元)',
+    'idle_mean': '平均闲置资金 (元)',
+    'idle_cost': '闲置资金机会成本 (元)',
+    'calls': '调度次数',
+    'min_pre_risk': '补金前最低风险度',
+}
+
+
+@dataclass(frozen=True)
+class OptimizeResult:
+    best: pd.Series            # 成本最低的可行候选；没有可行解时为 None
+    candidates: pd.DataFrame   # 全部评估过的候选 (含 round 与 feasible 列)
+    pareto: pd.DataFrame       # 可行候选中 (调度次数, 闲置资金) 的 Pareto 前沿
+
+
+def evaluate(spot, futures, q, ratio, m_rate, inject_rs, withdraw_rs, risk_floor=1.0, idle_rate=0.03,
+             periods_per_year=250, call_fee=0.0, engine='auto', workers=None):
+    """批量评估一组 (补金线, 提盈线) 候选，返回每个候选一行的成本与约束表。"""
+    inject_rs = np.asarray(inject_rs, dtype=np.float64)
+    withdraw_rs = np.asarray(withdraw_rs, dtype=np.float64)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(inject_rs)))
+    chunks = np.array_split(np.arange(len(inject_rs)), workers)
+
+    def run(idx):
+        return simulate_account_batch(spot, futures, q, ratio, m_rate, inject_rs[idx], withdraw_rs[idx],
+                                      engine=engine)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run, chunks))
+    else:
+        parts = [run(chunks[0])]
+    stats = {k: np.concatenate([p[k] for p in parts]) for k in BATCH_STATS}
+
+    table = pd.DataFrame({'inject_ratio': inject_rs, 'withdraw_ratio': withdraw_rs, **stats})
+    years = len(futures) / periods_per_year
+    table['calls'] = (table['injection_count'] + table['withdrawal_count']).astype(np.int64)
+    table['idle_cost'] = table['idle_mean'] * idle_rate * years
+    table['funding_cost'] = table['total_injection'] + call_fee * table['calls'] + table['idle_cost']
+    # 保证金要求恒为 0 (套保比例为 0) 时没有风险度可言，视为满足约束
+    table['feasible'] = table['min_pre_risk'].isna() | (table['min_pre_risk'] >= risk_floor)
+    return table
+
+
+def _grid(inject_bounds, withdraw_bounds, grid, min_gap):
+    ir, wr = np.meshgrid(np.linspace(*inject_bounds, grid), np.linspace(*withdraw_bounds, grid))
+    ir, wr = ir.ravel(), wr.ravel()
+    keep = wr >= ir + min_gap
+    return ir[keep], wr[keep]
+
+
+def _clip_box(center, half, bounds):
+    # 区间贴边时整体平移回给定范围内，保持宽度不变
+    lo = min(max(center - half, bounds[0]), max(bounds[1] - 2 * half, bounds[0]))
+    return lo, min(lo + 2 * half, bounds[1])
+
+
+def pareto_front(table, x='calls', y='idle_mean'):
+    """x、y 均越小越好；返回不被其他候选同时在两项上超过的行，按 x 升序。"""
+    data = table.sort_values([x, y], kind='stable')
+    best_y = data[y].cummin().shift(fill_value=np.inf)
+    return data[data[y] < best_y].reset_index(drop=True)
+
+
+def optimize_thresholds(spot, futures, q, ratio, m_rate, inject_bounds=(1.0, 2.0), withdraw_bounds=(1.1, 3.0),
+                        risk_floor=1.0, idle_rate=0.03, periods_per_year=250, call_fee=0.0, grid=9, rounds=4,
+                        min_gap=0.05, engine='auto', workers=None):
+    """逐轮收缩网格搜索最低资金成本的 (补金线, 提盈线)，返回 OptimizeResult。"""
+    spot = np.asarray(spot, dtype=np.float64)
+    futures = np.asarray(futures, dtype=np.float64)
+    lo_i, hi_i = inject_bounds
+    lo_w, hi_w = withdraw_bounds
+    if lo_i > hi_i or lo_w > hi_w:
+        raise ValueError("搜索区间的下限不能高于上限")
+    evaluated, best = [], None
+    for rnd in range(rounds):
+        ir, wr = _grid((lo_i, hi_i), (lo_w, hi_w), grid, min_gap)
+        if len(ir) == 0:
+            break
+        table = evaluate(spot, futures, q, ratio, m_rate, ir, wr, risk_floor=risk_floor, idle_rate=idle_rate,
+                         periods_per_year=periods_per_year, call_fee=call_fee, engine=engine, workers=workers)
+        table['round'] = rnd
+        evaluated.append(table)
+        feasible = table[table['feasible']]
+        if feasible.empty:
+            break                       # 区间内没有满足风险约束的候选，再细分也不会有
+        cand = feasible.loc[feasible['funding_cost'].idxmin()]
+        if best is None or cand['funding_cost'] < best['funding_cost']:
+            best = cand
+        # 以当前最优点为中心，区间缩小一半 (不超出给定的搜索区间)
+        half_i, half_w = (hi_i - lo_i) / 4, (hi_w - lo_w) / 4
+        lo_i, hi_i = _clip_box(best['inject_ratio'], half_i, inject_bounds)
+        lo_w, hi_w = _clip_box(best['withdraw_ratio'], half_w, withdraw_bounds)
+
+    candidates = pd.concat(evaluated, ignore_index=True) if evaluated else pd.DataFrame()
+    candidates = candidates.drop_duplicates(['inject_ratio', 'withdraw_ratio'], ignore_index=True)
+    feasible = candidates[candidates['feasible']] if len(candidates) else candidates
+    pareto = pareto_front(feasible) if len(feasible) else feasible
+    return OptimizeResult(best, candidates, pareto)
@@ -0,0 +1,203 @@
+"""多合约组合回测：多文件 / ZIP 输入，进程池并行模拟，汇总为组合层面曲线与指标。
+
+父进程把所有合约的 Spot / Futures 拼进一块共享内存，子进程按偏移量直接映射读取，
+结果也写回共享内存，任务参数里只有几个数字，DataFrame 全程不经过 pickle。
+"""
+import atexit
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .engine import simulate_account
+from .ingest import load_market_data
+from .metrics import initial_equity, summary_metrics, value_changes
+
+INPUT_FIELDS = ('Spot', 'Futures')
+OUTPUT_FIELDS = ('Account_Equity', 'Margin_Required', 'Cash_Injection', 'Cash_Withdrawal',
+                 'Value_Change_NoHedge', 'Value_Change_Hedged')
+
+_executor = None
+_executor_workers = None
+
+
+# ==============================================================================
+# 1. 📂 多文件 / ZIP 读取
+# ==============================================================================
+def load_contract_files(files):
+    """files 为 [(文件名或路径, 字节内容), ...]，ZIP 会展开其中的 CSV。
+
+    返回 {合约名: Date/Spot/Futures 表}；合约名默认取文件名，重名时见 _contract_name。
+    无法识别列的文件放在第二个返回值里。
+    """
+    contracts, skipped = {}, []
+    for name, payload in files:
+        if name.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+                members = [m for m in zf.namelist()
+                           if m.lower().endswith('.csv') and not m.startswith('__MACOSX/')]
+                entries = [(f'{name}/{m}', zf.read(m)) for m in members]
+        else:
+            entries = [(name, payload)]
+        for entry_name, data in entries:
+            frame, _ = load_market_data(data)
+            if frame is None or frame.empty:
+                skipped.append(entry_name)
+            else:
+                contracts[_contract_name(entry_name, contracts)] = frame[['Date', 'Spot', 'Futures']]
+    return contracts, skipped
+
+
+def _contract_name(entry_name, taken):
+    # 文件名重名 (压缩包里不同目录的同名文件、命令行重复给出) 时改用完整路径，仍重名再加序号，不互相覆盖
+    name = os.path.splitext(os.path.basename(entry_name))[0]
+    if name not in taken:
+        return name
+    path = os.path.splitext(entry_name.replace('\\', '/'))[0]
+    name, k = path, 2
+    while name in taken:
+        name, k = f'{path}#{k}', k + 1
+    return name
+
+
+# ==============================================================================
+# 2. ⚙️ 进程池与共享内存
+# ==============================================================================
+def get_executor(max_workers=None):
+    """进程常驻复用，避免每次回测都重新拉起解释器。"""
+    global _executor, _executor_workers
+    max_workers = max_workers or os.cpu_count() or 1
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        # spawn 在 Windows / macOS / Linux 行为一致，也不会从 Streamlit 的多线程进程里 fork
+        _executor = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        _executor_workers = max_workers
+    return _executor
+
+
+@atexit.register
+def _shutdown_executor():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _field_view(buf, total, fields, field, offset, n):
+    start = (fields.index(field) * total + offset) * 8
+    return np.ndarray((n,), dtype=np.float64, buffer=buf, offset=start)
+
+
+def _simulate_slice(task):
+    # 子进程入口：按偏移量映射共享内存，模拟后把结果写回，只返回一个字典的小指标
+    in_name, out_name, total, offset, n, params, engine = task
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        spot = _field_view(shm_in.buf, total, INPUT_FIELDS, 'Spot', offset, n)
+        futures = _field_view(shm_in.buf, total, INPUT_FIELDS, 'Futures', offset, n)
+        q, ratio, m_rate, inject_r, withdraw_r = (params[k] for k in
+                                                  ('q', 'ratio', 'm_rate', 'inject_r', 'withdraw_r'))
+        account = simulate_account(futures, q, ratio, m_rate, inject_r, withdraw_r, engine=engine)
+        init_eq = initial_equity(futures[0], q, ratio, m_rate, inject_r)
+        value_no, value_hedged = value_changes(spot, q, init_eq, account['Account_Equity'],
+                                               account['Cash_Injection'], account['Cash_Withdrawal'])
+        results = dict(account, Value_Change_NoHedge=value_no, Value_Change_Hedged=value_hedged)
+        for field in OUTPUT_FIELDS:
+            _field_view(shm_out.buf, total, OUTPUT_FIELDS, field, offset, n)[:] = results[field]
+        metrics = summary_metrics(value_no, value_hedged, account['Cash_Injection'], account['Cash_Withdrawal'])
+        metrics['injection_count'] = int(np.count_nonzero(account['Cash_Injection'] > 0))
+        metrics['withdrawal_count'] = int(np.count_nonzero(account['Cash_Withdrawal'] > 0))
+        del spot, futures
+        return metrics
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
+def simulate_contracts(contracts, params, overrides=None, max_workers=None, engine='auto'):
+    """并行模拟多个合约。
+
+    params 为所有合约共用的参数 dict (键 q / ratio / m_rate / inject_r / withdraw_r)，
+    overrides 可按合约名覆盖其中部分参数 (如不同品种的合约乘数)。
+    返回 ({合约名: 结果表}, 每合约指标表)。
+    """
+    overrides = overrides or {}
+    names = list(contracts)
+    lengths = [len(contracts[k]) for k in names]
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(int) if names else []
+    total = int(sum(lengths))
+    if total == 0:
+        return {}, pd.DataFrame()
+
+    shm_in = shared_memory.SharedMemory(create=True, size=total * 8 * len(INPUT_FIELDS))
+    shm_out = shared_memory.SharedMemory(create=True, size=total * 8 * len(OUTPUT_FIELDS))
+    try:
+        for name, offset, n in zip(names, offsets, lengths):
+            for field in INPUT_FIELDS:
+                _field_view(shm_in.buf, total, INPUT_FIELDS, field, offset, n)[:] = contracts[name][field].to_numpy()
+        tasks = [(shm_in.name, shm_out.name, total, int(offset), n,
+                  {**params, **overrides.get(name, {})}, engine)
+                 for name, offset, n in zip(names, offsets, lengths)]
+        workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        if workers > 1:
+            metrics = list(get_executor(workers).map(_simulate_slice, tasks))
+        else:
+            metrics = [_simulate_slice(t) for t in tasks]
+
+        frames = {}
+        for name, offset, n in zip(names, offsets, lengths):
+            frame = contracts[name][['Date', 'Spot', 'Futures']].reset_index(drop=True).copy()
+            for field in OUTPUT_FIELDS:
+                frame[field] = _field_view(shm_out.buf, total, OUTPUT_FIELDS, field, offset, n).copy()
+            frames[name] = frame
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+    return frames, pd.DataFrame(metrics, index=pd.Index(names, name='合约'))
+
+
+# ==============================================================================
+# 3. 🧾 组合层面汇总
+# ==============================================================================
+def combine_portfolio(frames):
+    """按时间对齐各合约曲线并求和。
+
+    价值变动与账户权益在某合约停牌/未上市的时间点沿用最近一次取值 (上市前记 0)，
+    补金 / 提盈只在实际发生的时间点计入。
+    """
+    level_cols = ['Account_Equity', 'Margin_Required', 'Value_Change_NoHedge', 'Value_Change_Hedged']
+    flow_cols = ['Cash_Injection', 'Cash_Withdrawal']
+    levels, flows = [], []
+    for name, frame in frames.items():
+        grouped = frame.groupby('Date', sort=True)
+        levels.append(grouped[level_cols].last().add_prefix(f'{name}|'))
+        flows.append(grouped[flow_cols].sum().add_prefix(f'{name}|'))
+    if not levels:
+        return pd.DataFrame(columns=['Date'] + level_cols + flow_cols)
+    level_df = pd.concat(levels, axis=1).sort_index().ffill().fillna(0)
+    flow_df = pd.concat(flows, axis=1).sort_index().fillna(0)
+    combined = pd.DataFrame(index=level_df.index)
+    for col in level_cols:
+        combined[col] = level_df.filter(like=f'|{col}').sum(axis=1)
+    for col in flow_cols:
+        combined[col] = flow_df.filter(like=f'|{col}').sum(axis=1)
+    return combined.rename_axis('Date').reset_index()
+
+
+def run_portfolio(contracts, params, overrides=None, max_workers=None, engine='auto'):
+    """组合回测入口：返回 (组合曲线, 组合指标 dict, 每合约指标表, 每合约结果表)。"""
+    frames, per_contract = simulate_contracts(contracts, params, overrides=overrides,
+                                              max_workers=max_workers, engine=engine)
+    combined = combine_portfolio(frames)
+    metrics = summary_metrics(combined['Value_Change_NoHedge'], combined['Value_Change_Hedged'],
+                              combined['Cash_Injection'], combined['Cash_Withdrawal'])
+    metrics['contract_count'] = len(frames)
+    return combined, metrics, per_contract, frames
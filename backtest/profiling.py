@@ -0,0 +1,168 @@
+"""分阶段性能记录：耗时、处理行数与内存分配，可导出为 JSON 或 OpenTelemetry 风格的 span。
+
+    profiler = Profiler(enabled=True)
+    with profiler.stage('process_data', rows=len(df)):
+        ...
+
+关闭时 stage 只是一个空的上下文管理器，不计时也不追踪内存。内存由 tracemalloc 统计
+(numpy 的数组分配同样计入)；tracemalloc 是进程级的，多个会话同时运行时数字会互相叠加，
+只适合单人排查。开启内存追踪的 Profiler 用完后调用 close() (或用 with 语句)：
+tracemalloc 按引用计数管理，最后一个追踪内存的 Profiler 关闭时才停止。
+"""
+import json
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_ENV = 'HEDGE_PROFILE'
+EXPORT_FORMATS = ('json', 'otel')
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0             # 正在追踪内存的 Profiler 个数
+_tracing_started = False       # tracemalloc 是否由本模块开启
+
+
+def env_enabled():
+    """环境变量 HEDGE_PROFILE 设为 1 / true / yes / on 时默认开启。"""
+    return os.environ.get(PROFILE_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Profiler:
+    """记录一次页面运行中各阶段的 span；阶段可以嵌套。"""
+
+    def __init__(self, enabled=True, trace_memory=True):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self._stack = []
+        self._tracing = False
+        if self.trace_memory:
+            _acquire_tracing()
+            self._tracing = True
+
+    def close(self):
+        """释放内存追踪；可重复调用。"""
+        if self._tracing:
+            self._tracing = False
+            _release_tracing()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # 页面脚本中途 st.stop() / 重跑时来不及 close，回收时兜底释放
+        self.close()
+
+    @contextmanager
+    def stage(self, name, rows=None, **attributes):
+        if not self.enabled:
+            yield
+            return
+        span = {
+            'name': name, 'span_id': secrets.token_hex(8),
+            'parent_id': self._stack[-1]['span_id'] if self._stack else None,
+            'depth': len(self._stack), 'rows': rows, 'attributes': attributes,
+            'start_ns': time.time_ns(),
+        }
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # 重置峰值前先把已经达到的峰值记到外层阶段上
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            span['_mem0'], span['_peak'] = current, current
+        self._stack.append(span)
+        t0 = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span['seconds'] = time.perf_counter() - t0
+            span['end_ns'] = span['start_ns'] + int(span['seconds'] * 1e9)
+            self._stack.pop()
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, span.pop('_peak'))
+                mem0 = span.pop('_mem0')
+                span['peak_alloc_mb'] = (peak - mem0) / 2 ** 20
+                span['net_alloc_mb'] = (current - mem0) / 2 ** 20
+                if self._stack:
+                    self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+            self.spans.append(span)
+
+    def records(self):
+        """按开始时间排序的阶段列表 (不含内部字段)。"""
+        return sorted(self.spans, key=lambda s: s['start_ns'])
+
+    def total_seconds(self):
+        return sum(s['seconds'] for s in self.spans if s['depth'] == 0)
+
+    def to_json(self):
+        return {'trace_id': self.trace_id, 'total_seconds': self.total_seconds(), 'stages': self.records()}
+
+    def to_otel(self, service_name='hedge-backtest'):
+        """OTLP/JSON 结构 (resourceSpans → scopeSpans → spans)，可直接导入支持 OTLP 的后端。"""
+        spans = []
+        for s in self.records():
+            attrs = {'rows': s['rows'], 'peak_alloc_mb': s.get('peak_alloc_mb'),
+                     'net_alloc_mb': s.get('net_alloc_mb'), **s['attributes']}
+            span = {
+                'traceId': self.trace_id, 'spanId': s['span_id'], 'name': s['name'], 'kind': 1,
+                'startTimeUnixNano': str(s['start_ns']), 'endTimeUnixNano': str(s['end_ns']),
+                'attributes': [_otel_attribute(k, v) for k, v in attrs.items() if v is not None],
+            }
+            if s['parent_id']:
+                span['parentSpanId'] = s['parent_id']
+            spans.append(span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_otel_attribute('service.name', service_name)]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }]}
+
+    def dumps(self, fmt='json'):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"未知的导出格式: {fmt!r}，可选 {EXPORT_FORMATS}")
+        data = self.to_json() if fmt == 'json' else self.to_otel()
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def append_to(self, path, fmt='json'):
+        """以 JSON Lines 形式追加写入：每次运行一行。"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(self.dumps(fmt) + '\n')
+
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+
+
+def _release_tracing():
+    # 最后一个使用者释放时才停止，且只停止自己开启的 tracemalloc，不干扰外部 (如基准脚本) 的内存追踪
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _otel_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
@@ -0,0 +1,145 @@
+"""区间汇总指标的 O(1) 查询：前缀和 / 前缀平方和 + 分块稀疏表 (区间最小值)。
+
+一次回测 (从数据集首行建仓) 之后，任意子区间 [i0, i1) 的指标卡数值都可以由预先建好的
+索引在常数时间内得到，拖动日期范围时不必重新回测、也不必扫描结果表：
+
+- 标准差：价值变动平移一个常数不改变标准差，由前缀和与前缀平方和直接算出 (ddof=1)。
+  前缀量按全序列均值中心化后再累加，减小大数相减的舍入误差；不超过 4 块的短区间直接计算
+- 最大亏损：区间内的价值变动以区间首行为零点重新计量，即区间最小值减去首行值；
+  区间最小值由分块稀疏表给出 (块内最多扫描两段不足一块的边角)
+- 补金 / 提盈的金额与次数：前缀和相减
+- NaN (无法解析的价格会在 ingest 中变成 NaN) 与 pandas 一样跳过：前缀和累加置零后的值，
+  另有非 NaN 行数的前缀计数；稀疏表用 np.fmin；零点取区间内第一个非 NaN 行
+
+这对应"固定建仓日、只看区间"的口径：账户状态沿用全历史回测，而不是在区间首日重新建仓；
+后者的账户路径与区间起点有关，只能重新回测。结果与对切片调用 summary_metrics 只差舍入误差。
+"""
+import numpy as np
+
+BLOCK = 64
+
+
+class RangeStats:
+    """单条序列的区间求和 / 标准差 / 最小值索引；NaN 与 pandas 一样跳过。"""
+
+    def __init__(self, values, block=BLOCK):
+        values = np.asarray(values, dtype=np.float64)
+        self.values = values
+        self.block = block
+        valid = ~np.isnan(values)
+        self._shift = float(values[valid].mean()) if valid.any() else 0.0
+        centered = np.where(valid, values - self._shift, 0.0)
+        self._sum = np.concatenate(([0.0], np.cumsum(centered)))
+        self._sq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        self._count = np.concatenate(([0], np.cumsum(valid)))
+        # 第 i 项为 i 及之后第一个非 NaN 行 (没有时为 n)
+        rows = np.where(valid, np.arange(len(values)), len(values))
+        self._next_valid = np.append(np.minimum.accumulate(rows[::-1])[::-1], len(values))
+
+        # 稀疏表建在块最小值上：第 k 层第 j 项为块 j .. j+2^k-1 的最小值，内存约 n / block × log2(n)
+        n_blocks = len(values) // block
+        level = (np.fmin.reduce(values[:n_blocks * block].reshape(n_blocks, block), axis=1) if n_blocks
+                 else np.empty(0))
+        self._table = [level]
+        width = 1
+        while 2 * width <= n_blocks:
+            level = np.fmin(level[:-width], level[width:])
+            self._table.append(level)
+            width *= 2
+
+    def __len__(self):
+        return len(self.values)
+
+    def count(self, i0, i1):
+        return int(self._count[i1] - self._count[i0])
+
+    def first(self, i0, i1):
+        """区间内第一个非 NaN 值；没有时为 NaN。"""
+        i = self._next_valid[i0]
+        return float(self.values[i]) if i < i1 else np.nan
+
+    def sum(self, i0, i1):
+        return (self._sum[i1] - self._sum[i0]) + self._shift * self.count(i0, i1)
+
+    def std(self, i0, i1, ddof=1):
+        n = self.count(i0, i1)
+        if n <= ddof:
+            return np.nan
+        if i1 - i0 <= 4 * self.block:
+            # 短区间局部方差可能远小于全序列，前缀量相减的相对误差偏大，直接算 (至多 4 块)
+            values = self.values[i0:i1]
+            return float(np.std(values[~np.isnan(values)], ddof=ddof))
+        s = self._sum[i1] - self._sum[i0]
+        var = ((self._sq[i1] - self._sq[i0]) - s * s / n) / (n - ddof)
+        return float(np.sqrt(max(var, 0.0)))
+
+    def min(self, i0, i1):
+        if i1 <= i0:
+            return np.nan
+        b0, b1 = -(-i0 // self.block), i1 // self.block
+        if b0 >= b1:
+            return float(np.fmin.reduce(self.values[i0:i1]))
+        k = (b1 - b0).bit_length() - 1
+        table = self._table[k]
+        out = np.fmin(table[b0], table[b1 - (1 << k)])
+        if i0 < b0 * self.block:
+            out = np.fmin(out, np.fmin.reduce(self.values[i0:b0 * self.block]))
+        if b1 * self.block < i1:
+            out = np.fmin(out, np.fmin.reduce(self.values[b1 * self.block:i1]))
+        return float(out)
+
+
+class SummaryIndex:
+    """一次回测结果的区间指标索引；metrics(i0, i1) 与 backtest_metrics 的键相同。"""
+
+    def __init__(self, value_no, value_hedged, cash_in, cash_out, block=BLOCK):
+        cash_in = np.nan_to_num(np.asarray(cash_in, dtype=np.float64), nan=0.0)
+        cash_out = np.nan_to_num(np.asarray(cash_out, dtype=np.float64), nan=0.0)
+        self.no = RangeStats(value_no, block)
+        self.hedged = RangeStats(value_hedged, block)
+        self._cash = {key: np.concatenate(([0.0], np.cumsum(values)))
+                      for key, values in (('in', cash_in), ('out', cash_out))}
+        self._count = {key: np.concatenate(([0], np.cumsum(values > 0)))
+                       for key, values in (('in', cash_in), ('out', cash_out))}
+
+    @classmethod
+    def from_frame(cls, df, block=BLOCK):
+        return cls(df['Value_Change_NoHedge'], df['Value_Change_Hedged'], df['Cash_Injection'],
+                   df['Cash_Withdrawal'], block)
+
+    def __len__(self):
+        return len(self.no)
+
+    @property
+    def nbytes(self):
+        arrays = [*self._cash.values(), *self._count.values()]
+        for stats in (self.no, self.hedged):
+            arrays += [stats._sum, stats._sq, stats._count, stats._next_valid, *stats._table]
+        return sum(a.nbytes for a in arrays)
+
+    def metrics(self, i0=0, i1=None):
+        """行区间 [i0, i1) 的汇总指标；价值变动以区间首个非 NaN 行为零点 (i0 = 0 时即全历史口径)。"""
+        i1 = len(self) if i1 is None else i1
+        i0, i1 = max(0, i0), min(i1, len(self))
+        std_raw, std_hedge = self.no.std(i0, i1), self.hedged.std(i0, i1)
+        if i1 > i0:
+            max_loss_no = self.no.min(i0, i1) - self.no.first(i0, i1)
+            max_loss_hedge = self.hedged.min(i0, i1) - self.hedged.first(i0, i1)
+        else:
+            max_loss_no = max_loss_hedge = np.nan
+        total_in = self._cash['in'][i1] - self._cash['in'][i0] if i1 > i0 else 0.0
+        total_out = self._cash['out'][i1] - self._cash['out'][i0] if i1 > i0 else 0.0
+        return {
+            'std_raw': std_raw,
+            'std_hedge': std_hedge,
+            'stability_boost': (1 - std_hedge / std_raw) * 100 if std_raw != 0 else 0,
+            'max_loss_no': max_loss_no,
+            'max_loss_hedge': max_loss_hedge,
+            'loss_saved': max_loss_hedge - max_loss_no,
+            'net_cash': total_out - total_in,
+            'rows': i1 - i0,
+            'injection_count': int(self._count['in'][i1] - self._count['in'][i0]) if i1 > i0 else 0,
+            'withdrawal_count': int(self._count['out'][i1] - self._count['out'][i0]) if i1 > i0 else 0,
+            'total_injection': float(total_in),
+            'total_withdrawal': float(total_out),
+        }
@@ -0,0 +1,59 @@
+"""多分辨率预聚合：把逐笔 / 分钟行情聚合成 5 分钟、1 小时、日线三级 OHLC K 线。
+
+每一级都由上一级聚合得到 (开 = 首根开盘，高 = 最高，低 = 最低，收 = 末根收盘)，
+整个金字塔只扫描一遍原始行。聚合后的表仍以 Spot / Futures 表示收盘价，可以直接交给
+process_data；Date 取桶内最后一条记录的时间 (收盘时刻)，按日期闭区间截取时与原始行
+落在同一天，也不会用到未来的价格。行数没有减少的级别 (例如上传的本来就是日线) 不单独保存。
+"""
+import numpy as np
+import pandas as pd
+
+LEVELS = ('raw', '5min', '1h', '1D')
+LEVEL_LABELS = {'raw': '原始数据', '5min': '5 分钟', '1h': '1 小时', '1D': '日线'}
+PRICE_COLUMNS = ('Spot', 'Futures')
+
+
+def ohlc_bars(frame, freq):
+    """按 freq 把 (已按时间排序的) 行情聚合为 K 线；输入可以是原始行，也可以是更细一级的 K 线。"""
+    key = frame['Date'].dt.floor(freq)
+    agg = {'Date': ('Date', 'last'), 'Rows': ('Rows', 'sum') if 'Rows' in frame else ('Date', 'size')}
+    for col in PRICE_COLUMNS:
+        has_ohlc = f'{col}_Open' in frame
+        agg[f'{col}_Open'] = (f'{col}_Open' if has_ohlc else col, 'first')
+        agg[f'{col}_High'] = (f'{col}_High' if has_ohlc else col, 'max')
+        agg[f'{col}_Low'] = (f'{col}_Low' if has_ohlc else col, 'min')
+        agg[col] = (col, 'last')
+    bars = frame.groupby(key.to_numpy(), sort=False).agg(**agg).reset_index(drop=True)
+    return bars[['Date', *PRICE_COLUMNS, 'Rows',
+                 *(f'{c}_{p}' for c in PRICE_COLUMNS for p in ('Open', 'High', 'Low'))]]
+
+
+def build_pyramid(frame):
+    """返回 {级别: 表}；'raw' 即原表，其余级别只在行数确实减少时出现。"""
+    levels = {'raw': frame}
+    prev = frame
+    for level in LEVELS[1:]:
+        bars = ohlc_bars(prev, level)
+        if len(bars) < len(prev):
+            levels[level] = bars
+            prev = bars
+    return levels
+
+
+def bars_per_day(frame):
+    """每个自然日的典型行数 (中位数，至少为 1)，用于把以天计的持仓周期换算为行数。"""
+    if frame.empty:
+        return 1
+    counts = frame['Date'].dt.normalize().value_counts(sort=False).to_numpy()
+    return max(1, int(np.median(counts)))
+
+
+def bars_per_day_chunks(chunks):
+    """bars_per_day 的分块版：逐块累计每个自然日的行数 (跨块的同一天合并计数)，内存只与天数有关。"""
+    counts = None
+    for chunk in chunks:
+        day = chunk['Date'].dt.normalize().value_counts(sort=False)
+        counts = day if counts is None else counts.add(day, fill_value=0)
+    if counts is None or counts.empty:
+        return 1
+    return max(1, int(np.median(counts.to_numpy())))
@@ -0,0 +1,164 @@
+"""跨进程共享的持久化结果库：本机 SQLite 文件，服务重启、多个工作进程之间共用。
+
+键为 (数据集指纹, 起止日期, q, 套保比例, 保证金率, 补金线, 提盈线, 持仓周期行数, 动态套保设置,
+保存精度, 换月与交易成本设置) 的规范化 JSON；值为紧凑结果 (逐行账户权益 / 动态套保比例 +
+事件日志五列，见 backtest.compact) 的 npz 数组块，外加一份 backtest_metrics 汇总指标 (JSON)。
+输入行情不入库，读出时按句柄从数据集登记表 / 磁盘 Arrow 缓存取。
+
+数据库以 WAL 模式打开，多个进程可以同时读、排队写；每次写入后按最近访问时间淘汰，
+使结果数据总量不超过 max_bytes。设置 HEDGE_RESULT_STORE=off 可以关闭。
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .compact import CompactResult
+from .events import EventLog
+from .ingest import default_cache_dir
+
+STORE_ENV = 'HEDGE_RESULT_STORE'
+MAX_BYTES = int(float(os.environ.get('HEDGE_RESULT_STORE_MB', 2048)) * 2 ** 20)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key         TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    metrics     TEXT,
+    data        BLOB NOT NULL,
+    nbytes      INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    accessed    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE INDEX IF NOT EXISTS results_fingerprint ON results (fingerprint);
+"""
+
+
+def result_key(handle, params, hedge=None, precision='float64', costs=None):
+    """规范化的结果键；params 为 (q, ratio, m_rate, inject_r, withdraw_r, days)。"""
+    hedge = hedge.to_list() if hedge is not None and hedge.dynamic else None
+    start = handle.start.isoformat() if handle.start is not None else None
+    end = handle.end.isoformat() if handle.end is not None else None
+    key = [handle.fingerprint, start, end, [float(p) for p in params], hedge, precision]
+    if costs is not None and costs.active:
+        key.append(costs.to_list())
+    return json.dumps(key)
+
+
+def _pack(result):
+    arrays = {f'event_{f}': getattr(result.events, f) for f in EventLog.__dataclass_fields__}
+    arrays['equity'] = result.equity
+    if result.ratios is not None:
+        arrays['ratios'] = result.ratios
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def _unpack(blob, handle, params, hedge, costs):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        events = EventLog(*(data[f'event_{f}'] for f in EventLog.__dataclass_fields__))
+        ratios = data['ratios'] if 'ratios' in data.files else None
+        return CompactResult(handle, tuple(params), hedge, data['equity'], events, ratios, costs)
+
+
+class ResultStore:
+    """SQLite 结果库；每次操作单独取连接，可在任意线程 / 进程中使用。"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 一个 with 块即一个事务：正常退出时提交，异常时回滚，最后关闭连接
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, handle, params, hedge=None, precision='float64', costs=None):
+        """取出紧凑结果并刷新访问时间；没有时返回 None。"""
+        key = result_key(handle, params, hedge, precision, costs)
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        return _unpack(row[0], handle, params, hedge, costs)
+
+    def metrics(self, handle, params, hedge=None, precision='float64', costs=None):
+        """只取汇总指标 (dict)；没有时返回 None。"""
+        key = result_key(handle, params, hedge, precision, costs)
+        with self._connect() as conn:
+            row = conn.execute('SELECT metrics FROM results WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def save(self, result, metrics=None):
+        """写入 (或覆盖) 一个紧凑结果，随后按最近访问时间淘汰超出容量的旧结果。"""
+        precision = 'float32' if result.equity.dtype == np.float32 else 'float64'
+        key = result_key(result.handle, result.params, result.hedge, precision, result.costs)
+        blob = _pack(result)
+        now = time.time()
+        text = json.dumps(metrics, default=float) if metrics is not None else None
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (key, result.handle.fingerprint, text, blob, len(blob), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        # 按访问时间从新到旧累加大小，超出容量的部分整体删除 (至少保留刚写入的一条)
+        conn.execute("""
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(nbytes) OVER (ORDER BY accessed DESC, key) AS running,
+                           ROW_NUMBER() OVER (ORDER BY accessed DESC, key) AS rank
+                    FROM results)
+                WHERE running > ? AND rank > 1)
+        """, (self.max_bytes,))
+
+    def stats(self):
+        """(结果条数, 结果数据总字节数)。"""
+        with self._connect() as conn:
+            count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM results').fetchone()
+        return int(count), int(total)
+
+    def clear(self, fingerprint=None):
+        with self._connect() as conn:
+            if fingerprint is None:
+                conn.execute('DELETE FROM results')
+            else:
+                conn.execute('DELETE FROM results WHERE fingerprint = ?', (fingerprint,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """进程内共享的结果库；HEDGE_RESULT_STORE 可指定数据库路径，设为 off / 0 时返回 None。"""
+    global _store
+    setting = os.environ.get(STORE_ENV, '').strip()
+    if setting.lower() in ('off', '0', 'false', 'no'):
+        return None
+    path = setting or os.path.join(default_cache_dir(), 'results.sqlite')
+    with _store_lock:
+        if _store is None or _store.path != path:
+            try:
+                _store = ResultStore(path)
+            except (OSError, sqlite3.Error):
+                return None
+        return _store
@@ -0,0 +1,122 @@
+"""滚动窗口 (walk-forward) 回测：把历史切成大量重叠窗口，逐窗口给出指标卡口径的指标。
+
+例如 12 个月窗口、每月滚动一次 (分钟数据可以按周 / 日切)：每个窗口都按首行价格重新建仓、独立推进保证金账户，
+与把日期范围设为该窗口时的指标卡完全相同。与窗口无关的量 (Basis、days 期差值)
+只在全历史上算一次，各窗口直接切片；窗口间互不依赖，账户推进按线程并行
+(Numba 内核释放 GIL)，窗口指标只保留汇总值，不生成逐窗口的结果表。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .core import _cycle_futures_pnl
+from .engine import simulate_account
+from .hedge import hedge_ratios
+from .metrics import initial_equity, summary_metrics, value_changes
+
+WF_UNITS = {'months': '月', 'weeks': '周', 'days': '日'}
+WF_METRICS = {
+    'stability_boost': '波动降低 (%)',
+    'loss_saved': '最大亏损修复额 (元)',
+    'net_cash': '累计调仓净额 (元)',
+    'injection_count': '补金次数',
+    'withdrawal_count': '提盈次数',
+    'cycle_std_reduction': '周期盈亏波动降低 (%)',
+}
+
+
+def window_bounds(dates, length=12, step=1, unit='months'):
+    """按自然日历切出完整窗口 (长 length、步长 step 个 unit)，
+    返回列为 start / end (日期闭区间) 与 i0 / i1 (行号左闭右开) 的表。"""
+    if unit not in WF_UNITS:
+        raise ValueError(f"未知的窗口单位: {unit!r}，可选 {tuple(WF_UNITS)}")
+    dates = pd.DatetimeIndex(dates)
+    columns = ['start', 'end', 'i0', 'i1']
+    if len(dates) == 0 or length < 1 or step < 1:
+        return pd.DataFrame(columns=columns)
+    span, stride = pd.DateOffset(**{unit: length}), pd.DateOffset(**{unit: step})
+    first, last = dates[0].normalize(), dates[-1].normalize()
+    starts = []
+    start = first
+    while start + span <= last + pd.Timedelta(days=1):
+        starts.append(start)
+        start = start + stride
+    starts = pd.DatetimeIndex(starts)
+    ends = starts + span                                   # 不含
+    day = dates.normalize()
+    i0 = np.searchsorted(day, starts, 'left')
+    i1 = np.searchsorted(day, ends, 'left')
+    table = pd.DataFrame({'start': starts.date, 'end': (ends - pd.Timedelta(days=1)).date, 'i0': i0, 'i1': i1})
+    return table[table['i1'] - table['i0'] >= 2].reset_index(drop=True)
+
+
+def _window_metrics(spot, futures, spot_diff, fut_diff, i0, i1, q, ratio, m_rate, inject_r, withdraw_r, days,
+                    engine, hedge):
+    s, f = spot[i0:i1], futures[i0:i1]
+    if hedge is not None:
+        # 动态套保比例在窗口内从首行开始估计，与单独回测该窗口一致
+        position, _ = hedge_ratios(s, f, hedge, ratio)
+        first_ratio = position[0]
+    else:
+        position = first_ratio = ratio
+    account = simulate_account(f, q, position, m_rate, inject_r, withdraw_r, engine=engine)
+    cash_in, cash_out = account['Cash_Injection'], account['Cash_Withdrawal']
+    value_no, value_hedged = value_changes(s, q, initial_equity(f[0], q, first_ratio, m_rate, inject_r),
+                                           account['Account_Equity'], cash_in, cash_out)
+    metrics = summary_metrics(value_no, value_hedged, cash_in, cash_out)
+
+    # 窗口前 days 行没有完整周期 (置 NaN)；之后的全历史差值与窗口内单独计算相同
+    head = min(days, i1 - i0)
+    cycle_no = spot_diff[i0:i1] * q
+    cycle_no[:head] = np.nan
+    if hedge is not None:
+        cycle_fut = _cycle_futures_pnl(f, q, position, days, None)[0]
+    else:
+        cycle_fut = -(fut_diff[i0:i1]) * q * ratio
+    std_no, std_hedge = pd.Series(cycle_no).std(), pd.Series(cycle_no + cycle_fut).std()
+    metrics.update(
+        injection_count=int(np.count_nonzero(cash_in > 0)),
+        withdrawal_count=int(np.count_nonzero(cash_out > 0)),
+        cycle_std_reduction=(1 - std_hedge / std_no) * 100 if std_no else np.nan,
+    )
+    return metrics
+
+
+def run_walk_forward(frame, q, ratio, m_rate, inject_r, withdraw_r, days, length=12, step=1, unit='months',
+                     engine='auto', hedge=None, shared=None, workers=None):
+    """逐窗口回测，返回每个窗口一行的表 (start / end / rows 与 WF_METRICS 及指标卡其余各项)。
+
+    frame 为按时间排序的 Date/Spot/Futures 表；shared 可传入与 frame 等长的 Spot_Diff / Futures_Diff
+    (例如 dataset.shared_columns 的结果)，不传则在这里对全表算一次。
+    """
+    hedge = hedge if hedge is not None and hedge.dynamic else None
+    bounds = window_bounds(frame['Date'], length, step, unit)
+    if bounds.empty:
+        return pd.DataFrame(columns=['start', 'end', 'rows', *WF_METRICS])
+    spot = frame['Spot'].to_numpy(dtype=np.float64)
+    futures = frame['Futures'].to_numpy(dtype=np.float64)
+    if shared is None:
+        shared = {'Spot_Diff': pd.Series(spot).diff(days).to_numpy(),
+                  'Futures_Diff': pd.Series(futures).diff(days).to_numpy()}
+    spot_diff = np.asarray(shared['Spot_Diff'], dtype=np.float64)
+    fut_diff = np.asarray(shared['Futures_Diff'], dtype=np.float64)
+
+    def run(window):
+        i0, i1 = window
+        return _window_metrics(spot, futures, spot_diff, fut_diff, i0, i1, q, ratio, m_rate, inject_r,
+                               withdraw_r, days, engine, hedge)
+
+    windows = list(zip(bounds['i0'], bounds['i1']))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(windows)))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(run, windows))
+    else:
+        rows = [run(w) for w in windows]
+    result = pd.DataFrame(rows)
+    result.insert(0, 'rows', (bounds['i1'] - bounds['i0']).to_numpy())
+    result.insert(0, 'end', bounds['end'].to_numpy())
+    result.insert(0, 'start', bounds['start'].to_numpy())
+    return result
@@ -0,0 +1 @@
+"""回测流水线的性能基准与数值回归检查 (python -m benchmarks.run)。"""
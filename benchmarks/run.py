@@ -0,0 +1,225 @@
+"""回测流水线基准：分阶段计时、峰值内存与数值一致性检查。
+
+    python -m benchmarks.run                               # 1k / 100k / 1M 行，结果写入 bench.json
+    python -m benchmarks.run --rows 1000 100000 -o new.json
+    python -m benchmarks.run --compare bench.json -o new.json   # 与旧结果对比，变慢超过阈值时返回 1
+
+计时取 --repeat 次中的最短时间；峰值内存用 tracemalloc 另跑一遍测得 (numpy 分配同样计入)，
+不会拖慢计时。每个引擎的 process_data 输出都与 reference (原版逐行循环) 逐列比对。
+"""
+import argparse
+import datetime
+import gc
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backtest import core, density, export, ingest, lod
+from backtest.engine import ENGINES, RESULT_COLUMNS, numba_available
+from backtest.events import EventLog
+
+from .synthetic import market_csv, synthetic_market
+
+DEFAULT_ROWS = (1_000, 100_000, 1_000_000)
+PARAMS = dict(q=30, ratio=1.0, m_rate=0.12, inject_r=1.2, withdraw_r=1.5, days=30)
+CHECK_COLUMNS = RESULT_COLUMNS + ('Value_Change_NoHedge', 'Value_Change_Hedged', 'Cycle_PnL_Hedge')
+
+
+def _timed(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _peak_mb(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def _max_abs_diff(df, ref):
+    """与参照结果逐列比较；NaN 位置必须一致，返回 (是否逐位相同, 最大绝对误差)。"""
+    identical, worst = True, 0.0
+    for col in CHECK_COLUMNS:
+        a, b = df[col].to_numpy(), ref[col].to_numpy()
+        if not np.array_equal(a, b, equal_nan=True):
+            identical = False
+            if not np.array_equal(np.isnan(a), np.isnan(b)):
+                return False, float('inf')
+            worst = max(worst, float(np.nanmax(np.abs(a - b))))
+    return identical, worst
+
+
+def _stages(rows, frame, csv_bytes, engines, max_xlsx_rows):
+    """返回 [(阶段名, 可调用对象, 需与 reference 比对的引擎名或 None)]，后面的阶段复用前面的输出。"""
+    import charts
+
+    ctx = {}
+
+    def run_engine(engine):
+        df = core.process_data(frame, *PARAMS.values(), engine=engine)
+        ctx.setdefault('df', df)
+        return df
+
+    stages = [('ingest.parse_csv', lambda: ingest.parse_market_csv(csv_bytes), None)]
+    for engine in engines:
+        stages.append((f'process_data[{engine}]', lambda e=engine: run_engine(e), engine))
+    stages += [
+        ('metrics', lambda: core.backtest_metrics(ctx['df']), None),
+        ('density.fft_kde', lambda: density.risk_density(ctx['df']['Cycle_PnL_NoHedge'].to_numpy(),
+                                                        ctx['df']['Cycle_PnL_Hedge'].to_numpy()), None),
+        ('lod.downsample', lambda: lod.downsample_frame(
+            ctx['df'], ['Line_Withdraw', 'Line_Inject', 'Account_Equity', 'Margin_Required'], 2000), None),
+        ('figures', lambda: _build_figures(charts, ctx['df']), None),
+        ('export[csv.gz]', lambda: export.write_report(io.BytesIO(), ctx['df'], fmt='csv.gz'), None),
+    ]
+    if 'parquet' in export.available_formats():
+        stages.append(('export[parquet]', lambda: export.write_report(io.BytesIO(), ctx['df'], fmt='parquet'), None))
+    if rows <= max_xlsx_rows:
+        stages.append(('export[xlsx]', lambda: export.write_report(
+            io.BytesIO(), ctx['df'], export.event_table(ctx['df']), fmt='xlsx'), None))
+    return stages
+
+
+def _build_figures(charts, df):
+    cols_t2 = ['Value_Change_NoHedge', 'Value_Change_Hedged']
+    cols_t4 = ['Line_Withdraw', 'Line_Inject', 'Account_Equity', 'Margin_Required']
+    log = EventLog.from_frame(df)
+    events = np.zeros(len(df), dtype=bool)
+    events[log.index] = True
+    return [
+        charts.price_basis_figure(lod.downsample_frame(df, ['Spot', 'Futures', 'Basis'], 2000), df['Basis'].mean()),
+        charts.hedge_stability_figure(lod.downsample_frame(df, cols_t2, 2000)),
+        charts.risk_distribution_figure(density.risk_density(df['Cycle_PnL_NoHedge'].to_numpy(),
+                                                             df['Cycle_PnL_Hedge'].to_numpy())),
+        charts.capital_channel_figure(lod.downsample_frame(df, cols_t4, 2000, keep=events), log, log),
+    ]
+
+
+def run(rows_list, engines, repeat=3, memory=True, max_xlsx_rows=100_000, seed=0, log=print):
+    # 先在小数据上把每个阶段跑一遍：Numba 内核加载、Plotly 模板初始化等一次性开销不计入计时
+    warm = synthetic_market(500, seed=seed)
+    for _, fn, _ in _stages(len(warm), warm, market_csv(warm), engines, max_xlsx_rows):
+        fn()
+
+    results = []
+    for rows in rows_list:
+        frame = synthetic_market(rows, seed=seed)
+        csv_bytes = market_csv(frame)
+        reference = None
+        for name, fn, engine in _stages(rows, frame, csv_bytes, engines, max_xlsx_rows):
+            seconds, out = _timed(fn, repeat)
+            record = {'rows': rows, 'stage': name, 'seconds': seconds}
+            if memory:
+                record['peak_mb'] = _peak_mb(fn)
+            if engine is not None:
+                if reference is None:
+                    reference = core.process_data(frame, *PARAMS.values(), engine='reference')
+                record['identical'], record['max_abs_diff'] = _max_abs_diff(out, reference)
+            results.append(record)
+            log(_format_record(record))
+    return results
+
+
+def _format_record(r):
+    text = f"{r['rows']:>10,d}  {r['stage']:<24s} {r['seconds'] * 1000:>10.1f} ms"
+    if 'peak_mb' in r:
+        text += f"  {r['peak_mb']:>8.1f} MB"
+    if 'identical' in r:
+        text += '  逐位一致' if r['identical'] else f"  最大误差 {r['max_abs_diff']:.3g}"
+    return text
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'numba': numba_available(),
+    }
+
+
+def compare(new, old, threshold):
+    """按 (行数, 阶段) 对齐两份结果，返回 (对比行, 是否存在回归)。"""
+    old_index = {(r['rows'], r['stage']): r for r in old['results']}
+    lines, regressed = [], False
+    for r in new['results']:
+        base = old_index.get((r['rows'], r['stage']))
+        if base is None:
+            continue
+        ratio = r['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag, regressed = '  ⚠️ 变慢', True
+        if base.get('identical', True) and not r.get('identical', True):
+            flag, regressed = '  ⚠️ 结果不再逐位一致', True
+        lines.append(f"{r['rows']:>10,d}  {r['stage']:<24s} {base['seconds'] * 1000:>10.1f} → "
+                     f"{r['seconds'] * 1000:>10.1f} ms  x{ratio:.2f}{flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='回测流水线性能基准')
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS), help='合成数据行数')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES), help='参与计时的账户引擎')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数 (取最短时间)')
+    parser.add_argument('--no-memory', action='store_true', help='跳过 tracemalloc 峰值内存测量')
+    parser.add_argument('--max-xlsx-rows', type=int, default=100_000, help='超过该行数时跳过 xlsx 导出计时')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench.json', help='结果 JSON 路径')
+    parser.add_argument('--compare', help='作为基线对比的旧结果 JSON')
+    parser.add_argument('--threshold', type=float, default=1.2, help='耗时超过基线该倍数即视为回归')
+    args = parser.parse_args(argv)
+
+    engines = [e for e in args.engines if e != 'numba' or numba_available()]
+    report = {'environment': environment(), 'params': PARAMS, 'results': []}
+    report['results'] = run(args.rows, engines, repeat=args.repeat, memory=not args.no_memory,
+                            max_xlsx_rows=args.max_xlsx_rows, seed=args.seed)
+    try:
+        import resource
+        # Linux 上 ru_maxrss 的单位是 KB
+        report['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = [r for r in report['results'] if r.get('identical') is False]
+    for r in failed:
+        print(f"数值不一致: {r['rows']} 行 {r['stage']} 最大误差 {r['max_abs_diff']}", file=sys.stderr)
+    regressed = False
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            lines, regressed = compare(report, json.load(f), args.threshold)
+        print('\n'.join(lines))
+    return 1 if failed or regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""单合约视图的图表构建 (只依赖 pandas / Plotly，不调用 Streamlit)。
+
+每个函数对应一个标签页，输入已降采样的绘图表与少量汇总量，返回 Figure；
+app.py 按 (数据集句柄, 参数, 视图范围) 缓存这些函数的结果，只构建当前可见的标签页。
+"""
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from backtest.events import INJECTION, WITHDRAWAL
+
+TABS = {
+    'price': "📉 价格基差监控",
+    'stability': "🛡️ 对冲波动稳定性",
+    'risk': "📊 风险概率分布",
+    'channel': "🏦 资金通道监管",
+}
+
+
+def price_basis_figure(plot_df, basis_mean):
+    """价格基差监控；basis_mean 为整个分析区间 (非视图范围) 的平均基差。"""
+    fig1 = go.Figure()
+
+    # 添加现货价格区域
+    fig1.add_trace(go.Scatter(
+        x=plot_df['Date'], y=plot_df['Spot']/10000, 
+        name='现货价格', 
+        line=dict(color='#2E86AB', width=3),
+        fill=None,
+        hovertemplate='<b>现货价格</b><br>时间: %{x}<br>价格: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 添加期货价格线
+    fig1.add_trace(go.Scatter(
+        x=plot_df['Date'], y=plot_df['Futures']/10000, 
+        name='期货价格', 
+        line=dict(color='#F24236', width=3, dash='dash'),
+        hovertemplate='<b>期货价格</b><br>时间: %{x}<br>价格: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 添加基差区域（使用副坐标轴）
+    fig1.add_trace(go.Scatter(
+        x=plot_df['Date'], y=plot_df['Basis']/10000, 
+        name='基差', 
+        fill='tozeroy',
+        fillcolor='rgba(169, 169, 169, 0.2)',
+        line=dict(color='rgba(169, 169, 169, 0.5)', width=1),
+        yaxis='y2',
+        hovertemplate='<b>基差</b><br>时间: %{x}<br>基差: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 计算基差平均线
+    mean_basis = basis_mean / 10000
+    fig1.add_hline(y=mean_basis, line_dash="dot", 
+                 line_color="gray", opacity=0.5,
+                 annotation_text=f"平均基差: {mean_basis:.2f}万",
+                 annotation_position="bottom right")
+
+    fig1.update_layout(
+        title="价格与基差走势监控",
+        template="plotly_white",
+        height=500,
+        hovermode="x unified",
+        margin=dict(t=50, b=50, l=50, r=50),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        xaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128, 128, 128, 0.1)',
+            title="时间"
+        ),
+        yaxis=dict(
+            title="价格 (万元)",
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128, 128, 128, 0.1)'
+        ),
+        yaxis2=dict(
+            title="基差 (万元)",
+            overlaying='y',
+            side='right',
+            showgrid=False
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    return fig1
+
+
+def hedge_stability_figure(plot_df):
+    """对冲波动稳定性：套保前后价值变动及其差值。"""
+    fig2 = make_subplots(
+        rows=2, cols=1,
+        row_heights=[0.7, 0.3],
+        vertical_spacing=0.1,
+        subplot_titles=("套保前后价值变动对比", "套保效果差值"),
+        shared_xaxes=True
+    )
+
+    # 主要图表：价值变动
+    fig2.add_trace(go.Scatter(
+        x=plot_df['Date'], y=plot_df['Value_Change_NoHedge']/10000, 
+        name='未套保',
+        line=dict(color='#FF6B6B', width=2, dash='dash'),
+        opacity=0.6,
+        hovertemplate='<b>未套保</b><br>时间: %{x}<br>价值变动: %{y:.2f}万<extra></extra>'
+    ), row=1, col=1)
+
+    fig2.add_trace(go.Scatter(
+        x=plot_df['Date'], y=plot_df['Value_Change_Hedged']/10000, 
+        name='套保后',
+        line=dict(color='#4ECDC4', width=3),
+        hovertemplate='<b>套保后</b><br>时间: %{x}<br>价值变动: %{y:.2f}万<extra></extra>'
+    ), row=1, col=1)
+
+    # 添加填充区域显示套保效果
+    fig2.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Value_Change_Hedged']/10000,
+        mode='lines',
+        line=dict(width=0),
+        showlegend=False,
+        hoverinfo='skip'
+    ), row=1, col=1)
+
+    fig2.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Value_Change_NoHedge']/10000,
+        mode='lines',
+        line=dict(width=0),
+        fill='tonexty',
+        fillcolor='rgba(255, 107, 107, 0.2)',
+        showlegend=False,
+        hoverinfo='skip'
+    ), row=1, col=1)
+
+    # 底部图表：套保效果（差值）
+    hedge_benefit = (plot_df['Value_Change_Hedged'] - plot_df['Value_Change_NoHedge'])/10000
+    fig2.add_trace(go.Bar(
+        x=plot_df['Date'], y=hedge_benefit,
+        name='套保效果',
+        marker_color=np.where(hedge_benefit > 0, '#4ECDC4', '#FF6B6B'),
+        opacity=0.7,
+        hovertemplate='<b>套保效果</b><br>时间: %{x}<br>效益: %{y:.2f}万<extra></extra>'
+    ), row=2, col=1)
+
+    # 添加零线
+    fig2.add_hline(y=0, line_dash="dot", line_color="gray", opacity=0.5, row=2, col=1)
+
+    fig2.update_layout(
+        template="plotly_white",
+        height=600,
+        hovermode="x unified",
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+
+    fig2.update_xaxes(title_text="时间", row=2, col=1)
+    fig2.update_yaxes(title_text="价值变动 (万元)", row=1, col=1)
+    fig2.update_yaxes(title_text="套保效益 (万元)", row=2, col=1)
+    return fig2
+
+
+def risk_distribution_figure(risk):
+    """风险概率分布：risk 为 backtest.density.risk_density 的结果 (None 时只画空坐标轴)。"""
+    fig3 = go.Figure()
+
+    if risk is not None:
+        x_range = risk['grid']
+
+        # 添加未套保KDE曲线
+        fig3.add_trace(go.Scatter(
+            x=x_range/10000, 
+            y=risk['nohedge']['density'],
+            name='未套保分布',
+            line=dict(color='#FF6B6B', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(255, 107, 107, 0.3)',
+            hovertemplate='<b>未套保</b><br>盈亏: %{x:.2f}万<br>概率密度: %{y:.4f}<extra></extra>'
+        ))
+
+        # 添加套保后KDE曲线
+        fig3.add_trace(go.Scatter(
+            x=x_range/10000, 
+            y=risk['hedge']['density'],
+            name='套保后分布',
+            line=dict(color='#4ECDC4', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(78, 205, 196, 0.3)',
+            hovertemplate='<b>套保后</b><br>盈亏: %{x:.2f}万<br>概率密度: %{y:.4f}<extra></extra>'
+        ))
+
+        # 统计指标换算为万元
+        stat_keys = ('mean', 'std', 'median', 'q5', 'q95')
+        stats_nohedge = {k: risk['nohedge'][k]/10000 for k in stat_keys}
+        stats_hedge = {k: risk['hedge'][k]/10000 for k in stat_keys}
+
+        # 添加统计标记
+        colors = {'nohedge': '#FF6B6B', 'hedge': '#4ECDC4'}
+
+        # 添加均值线
+        fig3.add_vline(x=stats_nohedge['mean'], line_dash="dash", 
+                     line_color=colors['nohedge'], opacity=0.8,
+                     annotation_text=f"未套保均值: {stats_nohedge['mean']:.2f}万",
+                     annotation_position="top right")
+
+        fig3.add_vline(x=stats_hedge['mean'], line_dash="dash", 
+                     line_color=colors['hedge'], opacity=0.8,
+                     annotation_text=f"套保后均值: {stats_hedge['mean']:.2f}万",
+                     annotation_position="top left")
+
+        # 添加分位数标记
+        fig3.add_vrect(x0=stats_nohedge['q5'], x1=stats_nohedge['q95'],
+                     fillcolor=colors['nohedge'], opacity=0.1, line_width=0,
+                     annotation_text="未套保90%区间", annotation_position="top")
+
+        fig3.add_vrect(x0=stats_hedge['q5'], x1=stats_hedge['q95'],
+                     fillcolor=colors['hedge'], opacity=0.1, line_width=0,
+                     annotation_text="套保后90%区间", annotation_position="bottom")
+
+        # 添加盈亏平衡线
+        fig3.add_vline(x=0, line_dash="dot", line_color="gray", opacity=0.7,
+                     annotation_text="盈亏平衡点", annotation_position="bottom")
+
+        # 添加统计摘要框
+        fig3.add_annotation(
+            x=0.02, y=0.98,
+            xref="paper", yref="paper",
+            text=(
+                f"<b>统计摘要</b><br>"
+                f"<span style='color:{colors['nohedge']}'>未套保:</span> "
+                f"μ={stats_nohedge['mean']:.2f}万, σ={stats_nohedge['std']:.2f}万<br>"
+                f"<span style='color:{colors['hedge']}'>套保后:</span> "
+                f"μ={stats_hedge['mean']:.2f}万, σ={stats_hedge['std']:.2f}万<br>"
+                f"波动降低: <b>{(1-stats_hedge['std']/stats_nohedge['std'])*100:.1f}%</b>"
+            ),
+            showarrow=False,
+            align="left",
+            bordercolor="black",
+            borderwidth=1,
+            borderpad=4,
+            bgcolor="white",
+            opacity=0.9,
+            font=dict(size=11)
+        )
+
+    fig3.update_layout(
+        title="风险概率密度分布 (KDE)",
+        template="plotly_white",
+        height=500,
+        xaxis_title="盈亏金额 (万元)",
+        yaxis_title="概率密度",
+        hovermode="x",
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(t=50, b=50, l=50, r=50)
+    )
+    return fig3
+
+
+def capital_channel_figure(plot_df, view_events, events):
+    """资金通道监管；view_events 为视图范围内的事件 (标记)，events 为全区间事件 (统计)，均为 EventLog。"""
+    view_inj_events, view_wit_events = view_events.of_kind(INJECTION), view_events.of_kind(WITHDRAWAL)
+    fig4 = go.Figure()
+
+    # 添加区域背景
+    fig4.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Line_Withdraw']/10000, 
+        name='提盈警戒线', 
+        line=dict(color='rgba(76, 175, 80, 0.5)', width=2, dash='dash'),
+        hovertemplate='<b>提盈线</b><br>时间: %{x}<br>金额: %{y:.2f}万<extra></extra>'
+    ))
+
+    fig4.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Line_Inject']/10000, 
+        name='补金警戒线', 
+        line=dict(color='rgba(244, 67, 54, 0.5)', width=2, dash='dash'),
+        fill='tonexty',
+        fillcolor='rgba(255, 235, 59, 0.2)',
+        hovertemplate='<b>补金线</b><br>时间: %{x}<br>金额: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 添加账户权益线
+    fig4.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Account_Equity']/10000, 
+        name='账户权益', 
+        line=dict(color='#2E86AB', width=4),
+        hovertemplate='<b>账户权益</b><br>时间: %{x}<br>权益: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 添加保证金要求线
+    fig4.add_trace(go.Scatter(
+        x=plot_df['Date'], 
+        y=plot_df['Margin_Required']/10000, 
+        name='保证金要求', 
+        line=dict(color='#F24236', width=2, dash='dot'),
+        opacity=0.7,
+        hovertemplate='<b>保证金要求</b><br>时间: %{x}<br>金额: %{y:.2f}万<extra></extra>'
+    ))
+
+    # 添加补金点（更美观的标记）
+    if len(view_inj_events):
+        fig4.add_trace(go.Scatter(
+            x=view_inj_events.date, 
+            y=view_inj_events.equity/10000,
+            mode='markers+text',
+            name='补金事件',
+            marker=dict(
+                color='#F24236',
+                symbol='triangle-up',
+                size=16,
+                line=dict(color='white', width=2)
+            ),
+            text=[f"+{amt/10000:.1f}" for amt in view_inj_events.amount],
+            textposition="top center",
+            textfont=dict(color='#F24236', size=10, family='Arial Black'),
+            hovertemplate='<b>补金事件</b><br>时间: %{x}<br>权益: %{y:.1f}万<br>补金: +%{text}万<extra></extra>'
+        ))
+
+    # 添加提盈点（更美观的标记）
+    if len(view_wit_events):
+        fig4.add_trace(go.Scatter(
+            x=view_wit_events.date, 
+            y=view_wit_events.equity/10000,
+            mode='markers+text',
+            name='提盈事件',
+            marker=dict(
+                color='#4CAF50',
+                symbol='triangle-down',
+                size=16,
+                line=dict(color='white', width=2)
+            ),
+            text=[f"-{amt/10000:.1f}" for amt in view_wit_events.amount],
+            textposition="bottom center",
+            textfont=dict(color='#4CAF50', size=10, family='Arial Black'),
+            hovertemplate='<b>提盈事件</b><br>时间: %{x}<br>权益: %{y:.1f}万<br>提盈: -%{text}万<extra></extra>'
+        ))
+
+    # 添加资金调度统计
+    total_injections = events.total(INJECTION)/10000
+    total_withdrawals = events.total(WITHDRAWAL)/10000
+
+    fig4.add_annotation(
+        x=0.98, y=0.02,
+        xref="paper", yref="paper",
+        text=(
+            f"<b>资金调度统计</b><br>"
+            f"补金次数: <span style='color:#F24236'>{events.count(INJECTION)}次</span><br>"
+            f"提盈次数: <span style='color:#4CAF50'>{events.count(WITHDRAWAL)}次</span><br>"
+            f"净流出: <b>{(total_withdrawals-total_injections):.1f}万</b>"
+        ),
+        showarrow=False,
+        align="right",
+        bordercolor="gray",
+        borderwidth=1,
+        borderpad=6,
+        bgcolor="white",
+        opacity=0.9,
+        font=dict(size=11)
+    )
+
+    fig4.update_layout(
+        title="资金通道监管 - 账户权益与资金调度",
+        template="plotly_white",
+        height=500,
+        hovermode="x unified",
+        yaxis=dict(title="金额 (万元)"),
+        xaxis=dict(title="时间"),
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(t=50, b=50, l=50, r=50)
+    )
+    return fig4
+
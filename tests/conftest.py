@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# 直接 pytest 运行时也能导入仓库根目录下的 backtest / benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtest import dataset, ingest  # noqa: E402
+from benchmarks.synthetic import synthetic_market  # noqa: E402
+
+PARAMS = (30, 0.9, 0.12, 1.2, 1.5, 40)      # q, ratio, m_rate, inject_r, withdraw_r, days (行)
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    # 磁盘缓存与结果库都落在临时目录，测试之间互不影响
+    monkeypatch.setenv(ingest.CACHE_DIR_ENV, str(tmp_path / 'cache'))
+    monkeypatch.setenv('HEDGE_RESULT_STORE', 'off')
+
+
+@pytest.fixture(scope='session')
+def market():
+    return synthetic_market(5000, seed=3, freq='h')
+
+
+@pytest.fixture
+def handle(market):
+    return dataset.register(market, 'test-market').window(None, None)
@@ -0,0 +1,16 @@
+import json
+
+import pytest
+
+from backtest.cli import main
+from benchmarks.synthetic import market_csv, synthetic_market
+
+
+@pytest.mark.parametrize('extra', [[], ['--chunk-rows', '1000']])
+def test_holding_days_converted_to_rows(tmp_path, capsys, extra):
+    path = tmp_path / 'hourly.csv'
+    path.write_bytes(market_csv(synthetic_market(24 * 60, seed=2, freq='h')))
+    assert main([str(path), '--holding-days', '3', '-o', str(tmp_path / 'out'), *extra]) == 0
+    metrics = json.loads(capsys.readouterr().out)[str(path)]
+    assert metrics['holding_rows'] == 3 * 24
+    assert metrics['rows'] == 24 * 60
@@ -0,0 +1,58 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtest import ingest
+
+HEADER = '时间,现货价格,期货主力价格\n'
+
+
+def integer_csv(bad_row=None):
+    rows = [f'2024-01-{d:02d},{5000 + d},{4900 + d}' for d in range(1, 21)]
+    if bad_row is not None:
+        date, _, futures = rows[bad_row].split(',')
+        rows[bad_row] = f'{date},停牌,{futures}'          # 价格列夹杂文本时走逐值容错转换
+    return (HEADER + '\n'.join(rows) + '\n').encode('utf-8')
+
+
+def test_integer_prices_parse_as_float64_on_both_paths():
+    fast = ingest.parse_market_csv(integer_csv())
+    lenient = ingest.parse_market_csv(integer_csv(bad_row=3))
+    for frame in (fast, lenient):
+        assert frame['Spot'].dtype == np.float64 and frame['Futures'].dtype == np.float64
+    assert np.isnan(lenient['Spot'].iloc[3])
+    pd.testing.assert_frame_equal(fast.drop(index=3), lenient.drop(index=3))
+
+
+def test_integer_prices_parse_as_float64_in_chunks():
+    chunks = list(ingest.iter_market_chunks(io.BytesIO(integer_csv(bad_row=12)), chunk_rows=5))
+    assert len(chunks) == 4
+    for chunk in chunks:
+        assert chunk['Spot'].dtype == np.float64 and chunk['Futures'].dtype == np.float64
+    frame = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(frame, ingest.parse_market_csv(integer_csv(bad_row=12)))
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    uploads = [integer_csv(bad_row=k) for k in range(4)]
+    fps = [ingest.fingerprint(data) for data in uploads]
+    paths = [ingest._cache_path(fp, str(tmp_path)) for fp in fps]
+    for k, data in enumerate(uploads[:3]):
+        ingest.load_market_data(data, str(tmp_path))
+        os.utime(paths[k], (k + 1, k + 1))              # 显式排好使用顺序
+    size = max(os.path.getsize(path) for path in paths[:3])
+    monkeypatch.setattr(ingest, 'CACHE_MAX_BYTES', int(2.5 * size))
+    assert ingest.load_cached_frame(fps[0], str(tmp_path)) is not None     # 读取刷新使用时间
+    ingest.load_market_data(uploads[3], str(tmp_path))
+    assert [os.path.exists(path) for path in paths] == [True, False, False, True]
+
+
+def test_cache_keeps_newest_file(tmp_path):
+    for k, data in enumerate((integer_csv(), integer_csv(bad_row=1))):
+        ingest.load_market_data(data, str(tmp_path))
+        os.utime(ingest._cache_path(ingest.fingerprint(data), str(tmp_path)), (k + 1, k + 1))
+    assert ingest.evict_cache(str(tmp_path), max_bytes=1) == 1
+    kept = ingest.load_cached_frame(ingest.fingerprint(integer_csv(bad_row=1)), str(tmp_path))
+    pd.testing.assert_frame_equal(kept, ingest.parse_market_csv(integer_csv(bad_row=1)))
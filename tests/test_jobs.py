@@ -0,0 +1,98 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import compact, jobs
+from backtest.costs import CostSpec
+from backtest.hedge import HedgeSpec
+from conftest import PARAMS
+
+
+@pytest.fixture
+def runner():
+    runner = jobs.JobRunner(max_workers=2, max_finished=2)
+    yield runner
+    runner._executor.shutdown(wait=True)
+
+
+def blocking(release, value=None, progress=None):
+    release.wait(10)
+    return value
+
+
+def test_same_key_shares_one_job(runner):
+    release, calls = threading.Event(), []
+
+    def task(progress=None):
+        calls.append(1)
+        release.wait(10)
+        return 'done'
+
+    first = runner.submit('k', task)
+    second = runner.submit('k', task)
+    assert first is second
+    release.set()
+    assert first.result(10) == 'done'
+    assert runner.submit('k', task) is first         # 已完成的任务直接复用
+    assert len(calls) == 1
+
+
+def test_failed_job_reruns_on_next_submit(runner):
+    attempts = []
+
+    def flaky(progress=None):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError('boom')
+        return 'ok'
+
+    failed = runner.submit('k', flaky)
+    failed.wait(10)
+    assert failed.failed
+    retried = runner.submit('k', flaky)
+    assert retried is not failed
+    assert retried.result(10) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_eviction_keeps_running_jobs(runner):
+    release = threading.Event()
+    running = runner.submit('running', blocking, release)
+    for k in range(5):
+        runner.submit(k, lambda progress=None, k=k: k).wait(10)
+    # 完成回调在 wait 返回之后才执行，稍等淘汰生效
+    deadline = time.time() + 5
+    while len(runner.jobs()) > 1 + runner.max_finished and time.time() < deadline:
+        time.sleep(0.01)
+    assert [job.key for job in runner.jobs()] == ['running', 3, 4]     # 运行中的保留，只淘汰最早完成的
+    release.set()
+    assert running.result(10) is None
+
+
+@pytest.mark.parametrize('hedge, costs', [
+    (None, None),
+    (HedgeSpec('ewma', halflife=30), None),
+    (None, CostSpec(commission=5, slippage=1.0, multiplier=10, roll_months=(1, 5, 9),
+                    margin_schedule=(('2020-03-01', 0.15),))),
+])
+def test_chunked_compact_backtest_matches_one_shot(handle, hedge, costs):
+    reports = []
+    chunked = jobs.compact_backtest(handle, *PARAMS, hedge=hedge, costs=costs, use_store=False, chunk_rows=1200,
+                                    progress=lambda p, message='', partial=None: reports.append((p, partial)))
+    direct = compact.compact_handle(handle, *PARAMS, hedge=hedge, costs=costs)
+    pd.testing.assert_frame_equal(chunked.frame, direct.frame, check_exact=True)
+    assert np.array_equal(chunked.equity, direct.equity)
+    progress = [p for p, _ in reports]
+    assert len(progress) == 5 and progress == sorted(progress) and progress[-1] == 1.0
+    assert reports[-1][1]['rows'] == len(direct.frame)
+
+
+def test_chunked_compact_backtest_on_window(market, handle):
+    window = handle.window(market['Date'].iloc[700], market['Date'].iloc[3900])
+    chunked = jobs.compact_backtest(window, *PARAMS, use_store=False, chunk_rows=500,
+                                    progress=lambda *args, **kwargs: None)
+    direct = compact.compact_handle(window, *PARAMS)
+    pd.testing.assert_frame_equal(chunked.frame, direct.frame, check_exact=True)
@@ -0,0 +1,23 @@
+import io
+import zipfile
+
+import pytest
+
+from backtest.portfolio import load_contract_files
+from benchmarks.synthetic import market_csv, synthetic_market
+
+
+@pytest.fixture
+def csv_bytes():
+    return market_csv(synthetic_market(200, seed=1, freq='D'))
+
+
+def test_duplicate_file_names_keep_every_contract(csv_bytes):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr('2023/rb.csv', csv_bytes)
+        zf.writestr('2024/rb.csv', csv_bytes)
+    contracts, skipped = load_contract_files([('data.zip', buf.getvalue()), ('rb.csv', csv_bytes),
+                                              ('rb.csv', csv_bytes)])
+    assert skipped == []
+    assert list(contracts) == ['rb', 'data.zip/2024/rb', 'rb#2', 'rb#3']
@@ -0,0 +1,45 @@
+import tracemalloc
+
+import numpy as np
+
+from backtest.profiling import Profiler
+
+
+def test_disabled_profiler_does_not_stop_tracing():
+    # 一个开启、一个关闭的 Profiler 同时存在 (例如两个会话 / 下载线程重叠)
+    assert not tracemalloc.is_tracing()
+    profiler = Profiler(enabled=True)
+    with profiler.stage('alloc'):
+        block = np.ones(10 * 2 ** 20 // 8)
+        other = Profiler(enabled=False)
+        with other.stage('noop'):
+            pass
+        other.close()
+        assert tracemalloc.is_tracing()
+        del block
+    profiler.close()
+    span, = profiler.records()
+    assert span['peak_alloc_mb'] > 9
+    assert abs(span['net_alloc_mb']) < 1
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_stops_after_last_profiler():
+    first, second = Profiler(enabled=True), Profiler(enabled=True)
+    first.close()
+    assert tracemalloc.is_tracing()
+    first.close()                                  # 重复 close 不重复释放
+    assert tracemalloc.is_tracing()
+    with second:
+        pass
+    assert not tracemalloc.is_tracing()
+
+
+def test_external_tracing_left_running():
+    tracemalloc.start()
+    try:
+        with Profiler(enabled=True):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from backtest.core import backtest_metrics, process_data
+from backtest.rangestats import SummaryIndex
+from conftest import PARAMS
+
+KEYS = ('std_raw', 'std_hedge', 'stability_boost', 'max_loss_no', 'max_loss_hedge', 'loss_saved', 'net_cash',
+        'rows', 'injection_count', 'withdrawal_count', 'total_injection', 'total_withdrawal')
+VALUE_COLUMNS = ['Value_Change_NoHedge', 'Value_Change_Hedged']
+
+
+def sliced_metrics(df, i0, i1):
+    # 区间口径：价值变动以区间内首个非 NaN 行为零点
+    part = df.iloc[i0:i1].copy()
+    for column in VALUE_COLUMNS:
+        values = part[column]
+        part[column] = values - values.dropna().iloc[0]
+    return backtest_metrics(part)
+
+
+@pytest.fixture
+def result(market):
+    frame = market.copy()
+    frame.loc[100, 'Spot'] = np.nan                  # ingest 把无法解析的价格记为 NaN
+    frame.loc[3000:3002, 'Spot'] = np.nan
+    return process_data(frame, *PARAMS)
+
+
+@pytest.mark.parametrize('i0, i1', [(0, 5000), (500, 2000), (99, 101), (100, 400), (2990, 3100),
+                                    (64, 4800)])
+def test_matches_backtest_metrics_with_nan(result, i0, i1):
+    assert result['Value_Change_NoHedge'].isna().any()
+    got = SummaryIndex.from_frame(result, block=16).metrics(i0, i1)
+    expected = sliced_metrics(result, i0, i1)
+    for key in KEYS:
+        assert got[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-6, nan_ok=True), key
+
+
+def test_all_nan_range(result):
+    metrics = SummaryIndex.from_frame(result).metrics(3000, 3003)
+    assert np.isnan(metrics['std_raw']) and np.isnan(metrics['max_loss_no'])
+    assert metrics['rows'] == 3
@@ -0,0 +1,94 @@
+import datetime
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import compact, core, jobs, store
+from backtest.costs import CostSpec
+from backtest.hedge import HedgeSpec
+from conftest import PARAMS
+
+
+@pytest.fixture
+def result_store(tmp_path):
+    return store.ResultStore(str(tmp_path / 'results.sqlite'))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 访问时间单调递增，淘汰顺序与写入 / 读取顺序一一对应
+    ticks = itertools.count(1)
+
+    class Clock:
+        @staticmethod
+        def time():
+            return float(next(ticks))
+
+    monkeypatch.setattr(store, 'time', Clock)
+
+
+@pytest.mark.parametrize('hedge, costs, precision', [
+    (None, None, 'float64'),
+    (HedgeSpec('ewma', halflife=30), None, 'float32'),
+    (None, CostSpec(commission=5, slippage=1.0, multiplier=10, roll_months=(1, 5, 9)), 'float64'),
+])
+def test_round_trip(result_store, handle, hedge, costs, precision):
+    result = compact.compact_handle(handle, *PARAMS, hedge=hedge, precision=precision, costs=costs)
+    metrics = core.backtest_metrics(result.frame)
+    result_store.save(result, metrics)
+    loaded = result_store.load(handle, PARAMS, hedge, precision, costs)
+    pd.testing.assert_frame_equal(loaded.frame, result.frame, check_exact=True)
+    assert loaded.equity.dtype == result.equity.dtype
+    assert result_store.metrics(handle, PARAMS, hedge, precision, costs) == pytest.approx(metrics)
+
+
+def test_key_separates_settings(result_store, handle):
+    result_store.save(compact.compact_handle(handle, *PARAMS))
+    assert result_store.load(handle, PARAMS) is not None
+    assert result_store.load(handle, PARAMS, precision='float32') is None
+    assert result_store.load(handle, PARAMS, HedgeSpec('ewma', halflife=30)) is None
+    assert result_store.load(handle, PARAMS, costs=CostSpec(commission=5)) is None
+    assert result_store.load(handle.window(None, datetime.date(2020, 3, 1)), PARAMS) is None
+    assert result_store.load(handle, PARAMS[:-1] + (41,)) is None
+    # 全部为默认值的成本设置等同于不设置
+    assert result_store.load(handle, PARAMS, costs=CostSpec()) is not None
+
+
+def test_eviction_by_access_time(tmp_path, handle, clock):
+    results = [compact.compact_handle(handle, *PARAMS[:-1], days) for days in (10, 20, 30)]
+    size = len(store._pack(results[0]))
+    result_store = store.ResultStore(str(tmp_path / 'results.sqlite'), max_bytes=int(2.5 * size))
+    result_store.save(results[0])
+    result_store.save(results[1])
+    assert result_store.load(handle, results[0].params) is not None        # 读取刷新访问时间
+    result_store.save(results[2])
+    assert result_store.stats()[0] == 2
+    assert result_store.load(handle, results[1].params) is None            # 最久未访问的被淘汰
+    assert result_store.load(handle, results[0].params) is not None
+    assert result_store.load(handle, results[2].params) is not None
+
+
+def test_eviction_keeps_newest_row(tmp_path, handle, clock):
+    result_store = store.ResultStore(str(tmp_path / 'results.sqlite'), max_bytes=1)
+    for days in (10, 20):
+        result_store.save(compact.compact_handle(handle, *PARAMS[:-1], days))
+    assert result_store.stats()[0] == 1
+    assert result_store.load(handle, PARAMS[:-1] + (20,)) is not None
+
+
+def test_compact_backtest_uses_store(tmp_path, monkeypatch, handle):
+    monkeypatch.setenv(store.STORE_ENV, str(tmp_path / 'shared.sqlite'))
+    first = jobs.compact_backtest(handle, *PARAMS)
+    assert store.get_store().stats()[0] == 1
+    # 结果库命中时不再回测
+    monkeypatch.setattr(jobs, '_compact_backtest', lambda *args: pytest.fail('store miss'))
+    second = jobs.compact_backtest(handle, *PARAMS)
+    assert np.array_equal(second.equity, first.equity)
+    assert store.get_store().metrics(handle, PARAMS)['rows'] == len(first.frame)
+
+
+def test_store_can_be_disabled(monkeypatch):
+    monkeypatch.setenv(store.STORE_ENV, 'off')
+    assert store.get_store() is None